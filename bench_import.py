@@ -0,0 +1,75 @@
+# bench_import.py
+# Cold-import cost of the project modules. Every sample runs in a fresh
+# interpreter with `python -X importtime`, so it measures what a short-lived
+# worker pays on startup. Also reports which heavy dependencies a module
+# pulls in at import time (mosalas_core should pull in none).
+#
+#   python bench_import.py                    # mosalas_core, mosalas, soap
+#   python bench_import.py mosalas_core -n 20 --top 10
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PATHS = [ROOT, os.path.join(ROOT, "prj 9")]
+DEFAULT_MODULES = ["mosalas_core", "mosalas", "soap"]
+HEAVY = ["numpy", "pyproj", "tkinter", "matplotlib", "pysimplesoap"]
+IMPORTTIME_RX = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+def import_once(module):
+    # -X importtime writes "self [us] | cumulative | package" lines to stderr
+    code = "import %s" % module
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(PATHS + [os.environ.get("PYTHONPATH", "")]))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError("import %s failed:\n%s" % (module, proc.stderr[-2000:]))
+    # children are printed before their parent, so the module's subtree is
+    # everything between the previous top-level line and its own
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RX.match(line)
+        if not m:
+            continue
+        name, depth = m.group(4), len(m.group(3)) // 2
+        rows.append((name, int(m.group(1)), int(m.group(2)), depth))
+        if depth == 0:
+            if name == module:
+                return rows
+            rows = []
+    raise RuntimeError("no importtime entry for %s" % module)
+
+def measure(module, runs):
+    totals = []
+    cumulative = {}
+    loaded = set()
+    for _ in range(runs):
+        rows = import_once(module)
+        totals.append(rows[-1][2] / 1000.0)
+        for name, _, cum, depth in rows:
+            loaded.add(name.split(".")[0])
+            if depth == 1:
+                cumulative.setdefault(name, []).append(cum / 1000.0)
+    heavy = [h for h in HEAVY if h in loaded]
+    deps = sorted(((statistics.median(v), k) for k, v in cumulative.items()), reverse=True)
+    return totals, heavy, deps
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of the project modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("-n", "--runs", type=int, default=10, help="fresh interpreters per module (default: 10)")
+    parser.add_argument("--top", type=int, default=5, help="direct imports to list per module (default: 5)")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        totals, heavy, deps = measure(module, args.runs)
+        print("%-14s median %8.1f ms   min %8.1f ms   heavy: %s"
+              % (module, statistics.median(totals), min(totals), ", ".join(heavy) or "-"))
+        for ms, name in deps[:args.top]:
+            print("    %-30s %8.1f ms" % (name, ms))
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,48 @@
 ### mrym zolfaqari ###
 #wenet
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from pyproj import Transformer
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import math
+import numpy as np
 import json
 import csv
+import sys
+import argparse
+import itertools
+import io
+import os
+import struct
+import threading
+import time
+from collections import deque
 from datetime import datetime
-from matplotlib import animation
-
-
-# Utilities: geometry & UTM
-TRANSFORMER_CACHE = {}
-
-def get_transformer_for_lon(lon):
-    zone = int((lon + 180) / 6) + 1
-    key = zone
-    if key in TRANSFORMER_CACHE:
-        return TRANSFORMER_CACHE[key]
-    crs_to = f"+proj=utm +zone={zone} +datum=WGS84 +units=m +no_defs"
-    transformer = Transformer.from_crs("EPSG:4326", crs_to, always_xy=True)
-    TRANSFORMER_CACHE[key] = transformer
-    return transformer
-
-def latlon_to_utm(lat, lon):
-    t = get_transformer_for_lon(lon)
-    x, y = t.transform(lon, lat)
-    return (float(x), float(y), int((lon + 180) / 6) + 1)
-
-def area_from_coords(A, B, C):
-    area2 = abs(A[0]*(B[1]-C[1]) + B[0]*(C[1]-A[1]) + C[0]*(A[1]-B[1]))
-    return area2/2.0
-
-def is_triangle(A, B, C, tol=1e-6):
-    return area_from_coords(A, B, C) > tol
-
-def dist(a, b):
-    return math.hypot(a[0]-b[0], a[1]-b[1])
-
-def triangle_perimeter(A, B, C):
-    return dist(A, B) + dist(B, C) + dist(C, A)
-
-def triangle_angles(A, B, C):
-    a = dist(B, C) 
-    b = dist(C, A) 
-    c = dist(A, B)  
-    def angle_from_sides(opposite, s1, s2):
-        denom = 2*s1*s2
-        if denom == 0:
-            return 0.0
-        val = (s1*s2*0 + s1*s2*0)  
-        cosv = (s1*s1 + s2*s2 - opposite*opposite) / denom
-        cosv = max(-1.0, min(1.0, cosv))
-        return math.degrees(math.acos(cosv))
-    A_ang = angle_from_sides(a, b, c)
-    B_ang = angle_from_sides(b, c, a)
-    C_ang = angle_from_sides(c, a, b)
-    return (A_ang, B_ang, C_ang)
-
-def triangle_type_by_sides(A, B, C, tol=1e-6):
-    a = dist(B, C)
-    b = dist(C, A)
-    c = dist(A, B)
-    sides = [a, b, c]
-    eq_ab = abs(a-b) <= tol
-    eq_bc = abs(b-c) <= tol
-    eq_ca = abs(c-a) <= tol
-    if eq_ab and eq_bc:
-        return "Equilateral"
-    if eq_ab or eq_bc or eq_ca:
-        return "Isosceles"
-    return "Scalene"
-
-def is_right_triangle(angles, tol_deg=1e-1):
-    return any(abs(a-90.0) <= tol_deg for a in angles)
+
+# geometry & UTM helpers (re-exported so existing mosalas.* callers keep working)
+from mosalas_core import (
+    ALL_UTM_ZONES, utm_zone, utm_zones, build_utm_transformer, TransformerPool, TRANSFORMER_POOL,
+    get_transformer_for_zone, get_transformer_for_lon, latlon_to_utm,
+    latlon_to_utm_bulk, area_from_coords, is_triangle, dist, triangle_perimeter,
+    triangle_angles, triangle_type_by_sides, is_right_triangle, TriangleMetrics,
+    triangle_metrics, TYPE_NAMES,
+    batch_side_lengths, batch_area, batch_triangle_metrics, batch_geodesic_metrics,
+    geodesic_metrics, latlon_in_range, TriangleGridIndex, points_in_triangles, triangles_intersect_boxes,
+)
+
+# tkinter/matplotlib are only loaded by the GUI (see _import_gui) so the
+# batch CLI can run on machines without a display
+tk = ttk = filedialog = messagebox = None
+Figure = FigureCanvasTkAgg = NavigationToolbar2Tk = animation = None
+PolyCollection = None
+
+def _import_gui():
+    global tk, ttk, filedialog, messagebox, Figure, FigureCanvasTkAgg, NavigationToolbar2Tk, animation
+    global PolyCollection
+    if tk is not None:
+        return
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+    from matplotlib import animation
+    from matplotlib.collections import PolyCollection
 
 
 # UI
@@ -110,18 +76,457 @@ def validate_number_string(s):
     except Exception:
         return False, None
 
+# Live preview helpers (pure, safe to run on a worker thread)
+LIVE_DEBOUNCE_MS = 150
+
+def project_points_cached(latlon, cache):
+    # cache: three (lat, lon, x, y, zone) tuples or None, one per point. Only
+    # points whose coordinates changed are projected; returns a new cache.
+    cache = list(cache)
+    stale = [i for i, p in enumerate(latlon) if cache[i] is None or cache[i][:2] != tuple(p)]
+    if stale:
+        xs, ys, zs = latlon_to_utm_bulk([latlon[i][0] for i in stale], [latlon[i][1] for i in stale])
+        for i, x, y, z in zip(stale, xs, ys, zs):
+            cache[i] = (latlon[i][0], latlon[i][1], float(x), float(y), int(z))
+    utm_pts = [(c[2], c[3]) for c in cache]
+    zones = set(c[4] for c in cache)
+    return cache, utm_pts, zones, len(stale)
+
+def compute_metrics(latlon, utm_pts, engine="utm"):
+    # the preview is always drawn in UTM; the numbers can come from either
+    if engine == "geodesic":
+        return geodesic_metrics(*latlon)
+    return triangle_metrics(*utm_pts)
+
+def live_compute(latlon, cache, engine="utm"):
+    cache, utm_pts, zones, projected = project_points_cached(latlon, cache)
+    return latlon, cache, utm_pts, zones, projected, compute_metrics(latlon, utm_pts, engine)
+
+
+# Preview renderer
+def set_equal_limits(ax, xmin, xmax, ymin, ymax, margin):
+    # widen one span to the axes' shape, so the equal aspect does not have to
+    # override (and warn about) the limits we just set
+    dx = (xmax - xmin if xmax!=xmin else 1.0) * (1 + 2*margin)
+    dy = (ymax - ymin if ymax!=ymin else 1.0) * (1 + 2*margin)
+    box = ax.bbox.height / max(ax.bbox.width, 1.0)
+    dx, dy = max(dx, dy / box), max(dy, dx * box)
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    ax.set_aspect("equal", adjustable="datalim")
+    ax.set_xlim(cx - dx/2, cx + dx/2)
+    ax.set_ylim(cy - dy/2, cy + dy/2)
+
+class TrianglePreview:
+    # The artists are created once; a new triangle only changes their data.
+    # The edge-tracing animation blits the moving artists over the cached
+    # axes background, so each frame costs the same regardless of the scene.
+    FRAMES = 30
+    INTERVAL_MS = 40
+    MARGIN = 0.08
+
+    def __init__(self, ax, canvas):
+        self.ax = ax
+        self.canvas = canvas
+        self.anim = None
+        self.mode = "perimeter"
+        self.xs = self.ys = None
+        ax.set_xlabel("Easting (m)")
+        ax.set_ylabel("Northing (m)")
+        ax.set_title("UTM Triangle Preview")
+        self.fill = ax.fill([], [], color="#ff7f50", alpha=0.35, zorder=1)[0]
+        self.outline, = ax.plot([], [], color="#d75a3a", linewidth=2, zorder=2)
+        self.edge, = ax.plot([], [], linewidth=4, solid_capstyle="round", zorder=4)
+        self.points = ax.scatter([], [], s=90, zorder=5)
+        self.labels = [ax.text(0, 0, "", fontsize=8, zorder=6) for _ in range(3)]
+        self.clear(redraw=False)
+
+    def _artists(self):
+        return [self.fill, self.outline, self.edge, self.points] + self.labels
+
+    def _animated_artists(self):
+        return [self.fill, self.outline, self.edge]
+
+    def clear(self, redraw=True):
+        self.stop()
+        for a in self._artists():
+            a.set_visible(False)
+        if redraw:
+            self.canvas.draw_idle()
+
+    def stop(self):
+        # a superseded animation sees self.anim change and ends on its next step
+        anim, self.anim = self.anim, None
+        if anim is not None and anim.event_source is not None:
+            anim.event_source.stop()
+        for a in self._animated_artists():
+            a.set_animated(False)
+
+    def show(self, pts, mode, color, animate=True, redraw=True):
+        self.stop()
+        self.mode = mode
+        self.xs = [p[0] for p in pts] + [pts[0][0]]
+        self.ys = [p[1] for p in pts] + [pts[0][1]]
+        xs, ys = self.xs, self.ys
+
+        set_equal_limits(self.ax, min(xs), max(xs), min(ys), max(ys), self.MARGIN)
+
+        self.fill.set_xy(list(zip(xs, ys)))
+        self.outline.set_data(xs, ys)
+        self.edge.set_color(color)
+        self.edge.set_linewidth(3 if mode == "area" else 4)
+        self.points.set_offsets(list(zip(xs[:-1], ys[:-1])))
+        self.points.set_color("#b03a2e" if mode == "area" else "#004a99")
+        self.points.set_visible(True)
+        for idx, (lbl, (px, py)) in enumerate(zip(self.labels, pts)):
+            lbl.set_position((px, py))
+            lbl.set_text(f"  {chr(65+idx)}\n  ({px:.2f}, {py:.2f})")
+            lbl.set_visible(True)
+
+        if not animate:
+            self._set_frame(self.FRAMES - 1)
+            if redraw:
+                self.canvas.draw()
+            return
+
+        # animated artists are left out of full redraws, so the background
+        # cached on the first frame holds only the grid, points and labels
+        for a in self._animated_artists():
+            a.set_animated(True)
+        self.anim = animation.FuncAnimation(
+            self.canvas.figure, self._set_frame, frames=self._frames, init_func=self._init_frame,
+            interval=self.INTERVAL_MS, blit=True, repeat=False, cache_frame_data=False)
+        self.canvas.draw_idle()
+
+    def _frames(self):
+        anim = self.anim
+        for fr in range(self.FRAMES):
+            if self.anim is not anim:
+                return
+            yield fr
+        # finished: hand the artists back to normal redraws (zoom, pan, resize)
+        for a in self._animated_artists():
+            a.set_animated(False)
+        self.anim = None
+        self.canvas.draw_idle()
+
+    def _init_frame(self):
+        if self.xs is None:
+            return []
+        return self._set_frame(0)
+
+    def _set_frame(self, fr):
+        xs, ys = self.xs, self.ys
+        last = fr >= self.FRAMES - 1
+        t = fr / (self.FRAMES - 1) * 3  # 0..3 segments
+        current = min(int(t), 3)
+        frac = t - current
+        drawn_x = xs[:current+1]
+        drawn_y = ys[:current+1]
+        if current < 3:
+            drawn_x = drawn_x + [xs[current] + (xs[current+1] - xs[current]) * frac]
+            drawn_y = drawn_y + [ys[current] + (ys[current+1] - ys[current]) * frac]
+        self.edge.set_data(drawn_x, drawn_y)
+        area_done = self.mode == "area" and last
+        self.fill.set_visible(area_done)
+        self.outline.set_visible(area_done)
+        self.edge.set_visible(not area_done)
+        return self._animated_artists()
+
+
+class OffscreenRenderer:
+    # Final preview state drawn into a private Agg Figure, never the live Tk
+    # canvas, so it can run on a worker thread or in another process.
+    def __init__(self, figsize=(7.8, 7.0)):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.fig = Figure(figsize=figsize, dpi=100)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.grid(True)
+        self.preview = TrianglePreview(self.ax, self.fig.canvas)
+
+    def render(self, path, pts, mode="perimeter", color="#2b7cff", dpi=300, facecolor="#ffffff", tight=True):
+        # tight=False skips the extra layout pass savefig needs for a tight
+        # bounding box (about 40% of the time of a small image)
+        self.ax.set_facecolor(facecolor)
+        self.preview.show(pts, mode, color, animate=False, redraw=False)
+        self.fig.savefig(path, dpi=dpi, bbox_inches="tight" if tight else None)
+        return path
+
+_OFFSCREEN = threading.local()
+
+def offscreen_renderer():
+    # one renderer (and Figure) per thread, reused for every image
+    renderer = getattr(_OFFSCREEN, "renderer", None)
+    if renderer is None:
+        renderer = _OFFSCREEN.renderer = OffscreenRenderer()
+    return renderer
+
+def render_triangle_png(path, pts, mode="perimeter", color="#2b7cff", dpi=300, facecolor="#ffffff"):
+    return offscreen_renderer().render(path, pts, mode, color, dpi, facecolor)
+
+
+class DatasetView:
+    # Whole survey batches in the preview axes. Only triangles overlapping the
+    # viewport are handed to matplotlib, as a single PolyCollection (filled in
+    # area mode, outlines only in perimeter mode; set_verts takes the (M,3,2)
+    # array without building a Path per triangle). Triangles smaller than MIN_POLYGON_PX
+    # on screen collapse to centroid dots, at most one per pixel, and ids are
+    # labelled only once few enough triangles are large enough to read.
+    MIN_POLYGON_PX = 2.0
+    MAX_POLYGONS = 20000
+    MAX_LABELS = 150
+    LABEL_MIN_PX = 40.0
+    MARGIN = 0.03
+
+    def __init__(self, ax, canvas, on_change=None):
+        self.ax = ax
+        self.canvas = canvas
+        self.on_change = on_change
+        self.mode = "perimeter"
+        self.tris = None
+        self._view = None
+        self.polys = PolyCollection([], zorder=1)
+        ax.add_collection(self.polys, autolim=False)
+        self.dots, = ax.plot([], [], linestyle="none", marker=",", color="#004a99", zorder=3)
+        self.labels = [ax.text(0, 0, "", fontsize=7, ha="center", va="center", zorder=6, clip_on=True)
+                       for _ in range(self.MAX_LABELS)]
+        ax.callbacks.connect("xlim_changed", self._on_view_change)
+        ax.callbacks.connect("ylim_changed", self._on_view_change)
+        canvas.mpl_connect("resize_event", self._on_view_change)
+        self.clear(redraw=False)
+
+    def _artists(self):
+        return [self.polys, self.dots] + self.labels
+
+    def clear(self, redraw=True):
+        self.tris = None
+        self._view = None
+        for a in self._artists():
+            a.set_visible(False)
+        if redraw:
+            self.canvas.draw_idle()
+
+    def load(self, ids, tris, mode="perimeter"):
+        # tris: (N,3,2) projected coordinates, ids: N labels
+        tris = np.asarray(tris, dtype=float)
+        self.ids = [str(i) for i in ids]
+        self.tris = tris
+        self.mode = mode
+        self.lo = tris.min(axis=1)
+        self.hi = tris.max(axis=1)
+        self.extent = (self.hi - self.lo).max(axis=1)
+        self.centroids = tris.mean(axis=1)
+
+        (xmin, ymin), (xmax, ymax) = self.lo.min(axis=0), self.hi.max(axis=0)
+        self._view = None
+        set_equal_limits(self.ax, xmin, xmax, ymin, ymax, self.MARGIN)
+        self.update()
+        self.canvas.draw_idle()
+
+    def set_mode(self, mode):
+        if self.tris is not None and mode != self.mode:
+            self.mode = mode
+            self._view = None
+            self.update()
+            self.canvas.draw_idle()
+
+    def _on_view_change(self, *args):
+        # toolbar pan/zoom changes the limits right before it redraws
+        self.update()
+
+    def update(self):
+        if self.tris is None:
+            return
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        px_w, px_h = max(self.ax.bbox.width, 1.0), max(self.ax.bbox.height, 1.0)
+        view = (x0, x1, y0, y1, px_w, px_h)
+        if view == self._view:
+            return
+        self._view = view
+        m_per_px = max((x1 - x0) / px_w, (y1 - y0) / px_h)
+
+        visible = np.flatnonzero((self.hi[:, 0] >= x0) & (self.lo[:, 0] <= x1) &
+                                 (self.hi[:, 1] >= y0) & (self.lo[:, 1] <= y1))
+        size_px = self.extent[visible] / m_per_px
+        big = visible[size_px >= self.MIN_POLYGON_PX]
+        small = visible[size_px < self.MIN_POLYGON_PX]
+        if len(big) > self.MAX_POLYGONS:
+            # keep the largest as polygons, the rest become dots
+            order = np.argpartition(-self.extent[big], self.MAX_POLYGONS)
+            small = np.concatenate([small, big[order[self.MAX_POLYGONS:]]])
+            big = big[order[:self.MAX_POLYGONS]]
+
+        self.polys.set_verts(self.tris[big])
+        if self.mode == "area":
+            self.polys.set_facecolor((1.0, 0.5, 0.31, 0.45))
+            self.polys.set_edgecolor("#d75a3a")
+            self.polys.set_linewidth(0.5)
+        else:
+            self.polys.set_facecolor("none")
+            self.polys.set_edgecolor("#2b7cff")
+            self.polys.set_linewidth(0.8)
+        self.polys.set_visible(True)
+
+        dots = self.centroids[small]
+        if len(dots):
+            cells = np.floor((dots - (x0, y0)) / m_per_px).astype(np.int64)
+            _, first = np.unique(cells[:, 0] * (int(px_h) + 3) + cells[:, 1], return_index=True)
+            dots = dots[first]
+        self.dots.set_data(dots[:, 0], dots[:, 1])
+        self.dots.set_visible(len(dots) > 0)
+
+        labelled = big[self.extent[big] / m_per_px >= self.LABEL_MIN_PX]
+        if len(labelled) > self.MAX_LABELS:
+            labelled = labelled[:0]
+        for lbl, i in zip(self.labels, labelled):
+            lbl.set_position(self.centroids[i])
+            lbl.set_text(self.ids[i])
+            lbl.set_visible(True)
+        for lbl in self.labels[len(labelled):]:
+            lbl.set_visible(False)
+
+        if self.on_change:
+            self.on_change(len(self.tris), len(visible), len(big), len(dots), len(labelled))
+
+
+# Background tasks
+class TaskCancelled(Exception):
+    pass
+
+class Task:
+    def __init__(self, name, key=None, cancellable=False, on_done=None):
+        self.name = name
+        self.key = key
+        self.cancellable = cancellable
+        self.on_done = on_done
+        self.done_count = 0
+        self.total = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    def report(self, done, total=None):
+        # progress callback handed to the job; also its cancellation point
+        self.done_count, self.total = done, total
+        if self._cancel.is_set():
+            raise TaskCancelled(self.name)
+
+    def cancel(self):
+        self._cancel.set()
+        self.future.cancel()  # only succeeds while still queued
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+
+class TaskQueue:
+    # Runs jobs one at a time on a worker thread, in submission order. Tk is
+    # only touched from the main loop: finished jobs are picked up by polling
+    # from root.after and their on_done(task, result, error) runs there.
+    POLL_MS = 50
+
+    def __init__(self, root, on_change=None, name="tasks"):
+        self.root = root
+        self.on_change = on_change
+        self.name = name
+        self.tasks = deque()  # submitted and not yet delivered; [0] is running
+        self._executor = None
+        self._after = None
+
+    def submit(self, name, fn, *args, on_done=None, key=None, progress=False, **kwargs):
+        # progress=True passes progress=task.report to fn, which makes the job
+        # cancellable. Submitting with a key supersedes earlier jobs that have
+        # the same key; they are delivered as cancelled.
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        if key is not None:
+            for t in self.tasks:
+                if t.key == key:
+                    t.cancel()
+        task = Task(name, key, progress, on_done)
+        if progress:
+            kwargs["progress"] = task.report
+        task.future = self._executor.submit(fn, *args, **kwargs)
+        self.tasks.append(task)
+        self._changed()
+        self._schedule()
+        return task
+
+    @property
+    def active(self):
+        return self.tasks[0] if self.tasks else None
+
+    def cancel_active(self):
+        if self.tasks and self.tasks[0].cancellable:
+            self.tasks[0].cancel()
+            self._changed()
+
+    def cancel_all(self):
+        # queued and running jobs are delivered as cancelled
+        for t in self.tasks:
+            t.cancel()
+        self._changed()
+
+    def shutdown(self):
+        # closing the app: cancel every job, stop polling and let the worker
+        # thread exit once the running job reaches its next progress report
+        self.cancel_all()
+        if self._after is not None:
+            self.root.after_cancel(self._after)
+            self._after = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def _schedule(self):
+        if self._after is None:
+            self._after = self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self._after = None
+        while self.tasks and self.tasks[0].future.done():
+            self._deliver(self.tasks.popleft())
+        self._changed()
+        if self.tasks:
+            self._schedule()
+
+    def _deliver(self, task):
+        from concurrent.futures import CancelledError
+        result, error = None, None
+        try:
+            result = task.future.result()
+        except CancelledError:
+            error = TaskCancelled(task.name)
+        except Exception as e:
+            error = e
+        if task.cancelled and error is None:
+            error = TaskCancelled(task.name)  # finished, but nobody wants it any more
+        if task.on_done:
+            task.on_done(task, result, error)
+
+
 # Main Application Class
     
 class TriangleAnalyzerApp:
     def __init__(self, root):
+        _import_gui()
         self.root = root
         root.title("Triangle Analyzer — WGS84 → UTM")
         root.geometry("1320x780")
         root.minsize(1100, 700)
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.dark_mode = False
         self._style_colors()
         self._build_ui()
         self.current_utm = None  
+        self.dataset_info = ""
 
     def _style_colors(self):
         self.bg_light = "#f4f7fb"
@@ -147,6 +552,16 @@ class TriangleAnalyzerApp:
 
         self.entries = []
         self.entry_error_labels = []
+        self.field_index = {}  # entry widget -> (point, 0 lat / 1 lon)
+        self.field_text = [[None, None] for _ in range(3)]
+        self.field_values = [[None, None] for _ in range(3)]
+        self.field_errors = [["", ""] for _ in range(3)]
+        self.point_cache = [None, None, None]
+        self._live_after = None
+        # long jobs show in the panel; live preview work has its own lane so
+        # typing is never stuck behind an export
+        self.tasks = TaskQueue(self.root, on_change=self._on_tasks, name="jobs")
+        self.live_tasks = TaskQueue(self.root, name="live")
 
         for i in range(3):
             frame = tk.Frame(left, bg=self.panel_bg)
@@ -169,6 +584,8 @@ class TriangleAnalyzerApp:
 
             lat_entry.bind("<KeyRelease>", self._on_input_change)
             lon_entry.bind("<KeyRelease>", self._on_input_change)
+            self.field_index[lat_entry] = (i, 0)
+            self.field_index[lon_entry] = (i, 1)
 
             err = tk.Label(left, text="", font=("Segoe UI", 9), fg=self.warn, bg=self.panel_bg)
             err.pack(anchor="w", padx=12)
@@ -180,10 +597,23 @@ class TriangleAnalyzerApp:
         mode_frame.pack(padx=12, pady=12, fill="x")
         tk.Label(mode_frame, text="Display Mode", font=("Segoe UI", 11, "bold"), bg=self.panel_bg, fg=self.text).pack(anchor="w")
         self.mode_var = tk.StringVar(value="perimeter")
-        r1 = ttk.Radiobutton(mode_frame, text="Highlight Perimeter", variable=self.mode_var, value="perimeter")
-        r2 = ttk.Radiobutton(mode_frame, text="Fill Area", variable=self.mode_var, value="area")
+        r1 = ttk.Radiobutton(mode_frame, text="Highlight Perimeter", variable=self.mode_var, value="perimeter",
+                             command=self._on_mode_change)
+        r2 = ttk.Radiobutton(mode_frame, text="Fill Area", variable=self.mode_var, value="area",
+                             command=self._on_mode_change)
         r1.pack(anchor="w", pady=4)
         r2.pack(anchor="w", pady=2)
+        engine_row = tk.Frame(mode_frame, bg=self.panel_bg)
+        engine_row.pack(anchor="w", pady=(6,0))
+        tk.Label(engine_row, text="Metrics:", font=("Segoe UI", 10, "bold"), bg=self.panel_bg, fg=self.text).pack(side="left")
+        self.engine_var = tk.StringVar(value="utm")
+        ttk.Radiobutton(engine_row, text="UTM plane", variable=self.engine_var, value="utm",
+                        command=self._on_input_change).pack(side="left", padx=(6,0))
+        ttk.Radiobutton(engine_row, text="Geodesic (WGS84)", variable=self.engine_var, value="geodesic",
+                        command=self._on_input_change).pack(side="left", padx=(6,0))
+        self.live_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(mode_frame, text="Live preview while typing", variable=self.live_var,
+                        command=self._on_input_change).pack(anchor="w", pady=(6,2))
 
 
         btns = tk.Frame(left, bg=self.panel_bg)
@@ -196,6 +626,8 @@ class TriangleAnalyzerApp:
         sample_btn.grid(row=0, column=2, padx=4)
         export_btn = ttk.Button(btns, text="Export...", command=self._export_menu)
         export_btn.grid(row=0, column=3, padx=4)
+        dataset_btn = ttk.Button(btns, text="Load Dataset...", command=self._load_dataset)
+        dataset_btn.grid(row=1, column=0, padx=4, pady=(6,0), sticky="w")
 
         # Info / results panel
         info = tk.Frame(left, bg="#fbfdff", bd=1, relief="solid")
@@ -221,6 +653,15 @@ class TriangleAnalyzerApp:
         self.status = tk.Label(left, text="Ready", font=("Segoe UI", 10), bg=self.panel_bg, fg="#333")
         self.status.pack(side="bottom", pady=8, fill="x")
 
+        jobs = tk.Frame(left, bg=self.panel_bg)
+        jobs.pack(side="bottom", padx=12, fill="x")
+        self.task_var = tk.StringVar(value="No background jobs.")
+        tk.Label(jobs, textvariable=self.task_var, font=("Segoe UI", 9), bg=self.panel_bg, fg="#666", anchor="w").pack(fill="x")
+        self.task_bar = ttk.Progressbar(jobs, mode="determinate")
+        self.task_bar.pack(side="left", fill="x", expand=True, pady=(2,0))
+        self.cancel_btn = ttk.Button(jobs, text="Cancel", command=self.tasks.cancel_active, state="disabled")
+        self.cancel_btn.pack(side="left", padx=(6,0))
+
         right = tk.Frame(root, bg="#eef4ff", bd=1, relief="solid")
         right.place(x=456, y=18, width=840, height=744)
 
@@ -239,6 +680,8 @@ class TriangleAnalyzerApp:
         toolbar = NavigationToolbar2Tk(self.canvas, right)
         toolbar.update()
         self.canvas._tkcanvas.pack(fill="both", expand=True)
+        self.preview = TrianglePreview(self.ax, self.canvas)
+        self.dataset = DatasetView(self.ax, self.canvas, on_change=self._on_dataset_view)
 
         dm_frame = tk.Frame(root, bg=self.bg_light)
         dm_frame.place(x=1180, y=12, width=160, height=36)
@@ -257,48 +700,102 @@ class TriangleAnalyzerApp:
         self._on_input_change()
 
     def _on_input_change(self, event=None):
-        for i, (lat_e, lon_e) in enumerate(self.entries):
-            lat_s = lat_e.get().strip()
-            lon_s = lon_e.get().strip()
-            err_msg = ""
-            valid_lat = False
-            valid_lon = False
-
-            if lat_s == "" or lat_s.startswith("Lat "):
-                err_msg = "Latitude is empty."
-            else:
-                ok, v = validate_number_string(lat_s)
-                if not ok:
-                    err_msg = "Latitude not numeric."
-                elif not (-90.0 <= v <= 90.0):
-                    err_msg = "Latitude out of range (-90..90)."
-                else:
-                    valid_lat = True
-
-            if lon_s == "" or lon_s.startswith("Lon "):
-                if err_msg == "":
-                    err_msg = "Longitude is empty."
-                else:
-                    err_msg += " Longitude is empty."
-            else:
-                ok2, w = validate_number_string(lon_s)
-                if not ok2:
-                    err_msg = (err_msg + " " if err_msg else "") + "Longitude not numeric."
-                elif not (-180.0 <= w <= 180.0):
-                    err_msg = (err_msg + " " if err_msg else "") + "Longitude out of range (-180..180)."
-                else:
-                    valid_lon = True
-
-            if valid_lat:
-                lat_e.config(bg="#eaffea")
-            else:
-                lat_e.config(bg="#ffecec")
-            if valid_lon:
-                lon_e.config(bg="#eaffea")
+        # a keystroke only re-validates its own field; no event (sample,
+        # live toggle) means all six
+        field = self.field_index.get(getattr(event, "widget", None))
+        fields = [field] if field else [(i, k) for i in range(3) for k in range(2)]
+        changed = False
+        for i, k in fields:
+            changed = self._validate_field(i, k) or changed
+        if self.live_var.get() and (changed or field is None):
+            self._schedule_live()
+
+    def _validate_field(self, i, k):
+        entry = self.entries[i][k]
+        text = entry.get().strip()
+        if text == self.field_text[i][k]:
+            return False
+        self.field_text[i][k] = text
+        name, lo, hi, placeholder = (("Latitude", -90.0, 90.0, "Lat ") if k == 0 else
+                                     ("Longitude", -180.0, 180.0, "Lon "))
+        value = None
+        if text == "" or text.startswith(placeholder):
+            err = f"{name} is empty."
+        else:
+            ok, v = validate_number_string(text)
+            if not ok:
+                err = f"{name} not numeric."
+            elif not (lo <= v <= hi):
+                err = f"{name} out of range ({lo:g}..{hi:g})."
             else:
-                lon_e.config(bg="#ffecec")
+                err = ""
+                value = v
+        self.field_values[i][k] = value
+        self.field_errors[i][k] = err
+        entry.config(bg="#eaffea" if value is not None else "#ffecec")
+        self.entry_error_labels[i].config(text=" ".join(e for e in self.field_errors[i] if e))
+        return True
+
+    def _schedule_live(self):
+        # debounce: only the last keystroke in a burst starts a computation
+        if self._live_after is not None:
+            self.root.after_cancel(self._live_after)
+        self._live_after = self.root.after(LIVE_DEBOUNCE_MS, self._start_live)
+
+    def _start_live(self):
+        self._live_after = None
+        if not self.live_var.get():
+            return
+        latlon = [tuple(v) for v in self.field_values]
+        if any(v is None for p in latlon for v in p):
+            return
+        self.live_tasks.submit("Live preview", live_compute, latlon, self.point_cache, self.engine_var.get(),
+                               key="live", on_done=self._apply_live)
+
+    def _apply_live(self, task, result, error):
+        if isinstance(error, TaskCancelled):
+            return  # superseded by a newer edit
+        if error is not None:
+            self.status.config(text=f"Live preview failed: {error}", fg=self.warn)
+            return
+        latlon, cache, utm_pts, zones, projected, metrics = result
+        self.point_cache = cache
+        if metrics.min_edge < MIN_EDGE_M:
+            self.status.config(text="Live: some points are closer than 1 mm.", fg=self.warn)
+            return
+        if not metrics.is_triangle():
+            self.status.config(text="Live: the points are collinear.", fg=self.warn)
+            return
+        self._show_metrics(metrics, latlon, utm_pts, zones)
+        self.dataset.clear(redraw=False)
+        self.preview.show(utm_pts, self.mode_var.get(), self.accent, animate=False, redraw=False)
+        self.canvas.draw_idle()
+        note = f" Zones {sorted(zones)}." if len(zones) > 1 else ""
+        engine = "geodesic" if self.engine_var.get() == "geodesic" else "UTM"
+        self.status.config(text=f"Live ({engine}): {projected} point(s) re-projected.{note}", fg="#006400")
+
+    def _on_mode_change(self):
+        self.dataset.set_mode(self.mode_var.get())
+        if self.current_utm and self.preview.anim is None and self.dataset.tris is None:
+            self.preview.show(self.current_utm, self.mode_var.get(), self.accent, animate=False, redraw=False)
+            self.canvas.draw_idle()
 
-            self.entry_error_labels[i].config(text=err_msg)
+    def _show_metrics(self, metrics, latlon, utm_pts, zones):
+        per, area, sides, angles = metrics.perimeter, metrics.area, metrics.sides, metrics.angles
+        self.perim_var.set(f"Perimeter: {per:.3f} m ({per/1000:.6f} km)")
+        self.area_var.set(f"Area: {area/1e6:.9f} km²")
+        self.side_vars[0].set(f"AB: {sides[0]:.3f} m")
+        self.side_vars[1].set(f"BC: {sides[1]:.3f} m")
+        self.side_vars[2].set(f"CA: {sides[2]:.3f} m")
+        self.angle_vars[0].set(f"∠A: {angles[0]:.3f}°")
+        self.angle_vars[1].set(f"∠B: {angles[1]:.3f}°")
+        self.angle_vars[2].set(f"∠C: {angles[2]:.3f}°")
+        orientation = self._orientation_latlon_order(latlon)  # CW/CCW in latlon order
+        self.meta_var.set(f"Type: {metrics.type} | Orientation: {orientation} | Right-angled: {'Yes' if metrics.right else 'No'}")
+
+        self.current_utm = utm_pts
+        self.current_latlon = latlon
+        self.current_zones = zones
 
     def on_draw(self):
         # Clear status
@@ -338,68 +835,42 @@ class TriangleAnalyzerApp:
             return
 
         try:
-            utm_pts = []
-            zones = set()
-            for (latv, lonv) in latlon:
-                x, y, zone = latlon_to_utm(latv, lonv)
-                utm_pts.append((x, y))
-                zones.add(zone)
+            self.point_cache, utm_pts, zones, _ = project_points_cached(latlon, self.point_cache)
         except Exception as e:
             messagebox.showerror("Conversion Error", f"Error converting to UTM:\n{e}")
             return
 
-        if len(zones) > 1:
+        engine = self.engine_var.get()
+        if len(zones) > 1 and engine == "geodesic":
+            self.status.config(text=f"Points in UTM zones {sorted(zones)}: metrics are geodesic, only the preview mixes zones.", fg="#006400")
+        elif len(zones) > 1:
             self.status.config(text=f"Warning: Points in multiple UTM zones: {sorted(zones)}. Visualization still shown.", fg="#b06b00")
+        elif engine == "geodesic":
+            self.status.config(text="Geodesic metrics (WGS84), preview in UTM.", fg="#006400")
         else:
             self.status.config(text="Converted to UTM.", fg="#006400")
 
-        A, B, C = utm_pts
+        metrics = compute_metrics(latlon, utm_pts, engine)
 
-        
-        min_pair_dist = min(dist(A, B), dist(B, C), dist(C, A))
-        if min_pair_dist < 1e-3:  # less than 1 mm
+        if metrics.min_edge < MIN_EDGE_M:  # less than 1 mm
             messagebox.showerror("Degenerate Points", "Some points are extremely close (less than 1 mm). Check inputs.")
             return
         
-        max_pair_dist = max(dist(A, B), dist(B, C), dist(C, A))
-        if max_pair_dist > 3e6:  # > 3000 km
+        max_pair_dist = metrics.max_edge
+        if max_pair_dist > MAX_EDGE_M:  # > 3000 km
             if not messagebox.askyesno("Large Distances", f"One edge is > {max_pair_dist/1000:.1f} km. Continue?"):
                 return
 
         
-        if not is_triangle(A, B, C):
+        if not metrics.is_triangle():
             messagebox.showerror("Not a Triangle", "These three points are collinear (do not form a valid triangle).")
             # clear plot
-            self.ax.clear(); self.ax.grid(True); self.canvas.draw()
+            self.preview.clear()
             self.perim_var.set("Perimeter: -"); self.area_var.set("Area: -")
             return
 
-        
-        per = triangle_perimeter(A, B, C)
-        area = area_from_coords(A, B, C)
-        sides = [dist(A, B), dist(B, C), dist(C, A)]
-        angles = triangle_angles(A, B, C)
-        ttype = triangle_type_by_sides(A, B, C)
-        right = is_right_triangle(angles)
-
-       
-        self.perim_var.set(f"Perimeter: {per:.3f} m ({per/1000:.6f} km)")
-        self.area_var.set(f"Area: {area/1e6:.9f} km²")
-        self.side_vars[0].set(f"AB: {sides[0]:.3f} m")
-        self.side_vars[1].set(f"BC: {sides[1]:.3f} m")
-        self.side_vars[2].set(f"CA: {sides[2]:.3f} m")
-        self.angle_vars[0].set(f"∠A: {angles[0]:.3f}°")
-        self.angle_vars[1].set(f"∠B: {angles[1]:.3f}°")
-        self.angle_vars[2].set(f"∠C: {angles[2]:.3f}°")
-        orientation = self._orientation_latlon_order(latlon)  # CW/CCW in latlon order
-        self.meta_var.set(f"Type: {ttype} | Orientation: {orientation} | Right-angled: {'Yes' if right else 'No'}")
-
-        
-        self.current_utm = utm_pts
-        self.current_latlon = latlon
-        self.current_zones = zones
+        self._show_metrics(metrics, latlon, utm_pts, zones)
 
-       
         mode = self.mode_var.get()
         self._animate_and_plot(utm_pts, mode)
 
@@ -410,104 +881,35 @@ class TriangleAnalyzerApp:
         return "CCW" if s > 0 else "CW"
 
     def _animate_and_plot(self, pts, mode):
-        self.ax.clear()
-        self.ax.grid(True)
-        xs = [p[0] for p in pts] + [pts[0][0]]
-        ys = [p[1] for p in pts] + [pts[0][1]]
-
-        self.canvas.draw_idle()
-
-       
-        xmin, xmax = min(xs), max(xs)
-        ymin, ymax = min(ys), max(ys)
-        dx = xmax - xmin if xmax!=xmin else 1.0
-        dy = ymax - ymin if ymax!=ymin else 1.0
-        margin = 0.08
-        self.ax.set_xlim(xmin - dx*margin, xmax + dx*margin)
-        self.ax.set_ylim(ymin - dy*margin, ymax + dy*margin)
-        self.ax.set_aspect("equal", adjustable="datalim")
-        self.ax.set_xlabel("Easting (m)")
-        self.ax.set_ylabel("Northing (m)")
-        self.ax.set_title("UTM Triangle Preview")
-
-        
-        if mode == "area":
-            self.ax.fill(xs, ys, color="#ff7f50", alpha=0.35, zorder=1)
-            self.ax.plot(xs, ys, color="#d75a3a", linewidth=2, zorder=2)
-        else:
-            self.ax.plot(xs, ys, color=self.accent, linewidth=4, zorder=2)
-
-        for idx, (px, py) in enumerate(pts):
-            self.ax.scatter(px, py, s=90, color="#004a99", zorder=3)
-            self.ax.text(px, py, f"  {chr(65+idx)}\n  ({px:.2f}, {py:.2f})", fontsize=8, zorder=4)
-
-        self.canvas.draw_idle()
+        self.dataset.clear(redraw=False)
+        self.preview.show(pts, mode, self.accent)
 
+    def _load_dataset(self):
+        fn = filedialog.askopenfilename(title="Open triangle dataset",
+                                        filetypes=[("Triangle files", "*.csv *.geojson *.json *.geojsons *.ndjson"),
+                                                   ("All files", "*.*")])
+        if not fn:
+            return
+        self.tasks.submit(f"Loading {os.path.basename(fn)}", load_dataset_utm, fn, progress=True,
+                          on_done=lambda task, result, error: self._dataset_loaded(fn, result, error))
 
-        
-        lines = []
-        scat = None
-        fillpoly = None
-
-        
-        xmin, xmax = min(xs), max(xs)
-        ymin, ymax = min(ys), max(ys)
-        dx = xmax - xmin if xmax!=xmin else 1.0
-        dy = ymax - ymin if ymax!=ymin else 1.0
-        margin = 0.08
-        self.ax.set_xlim(xmin - dx*margin, xmax + dx*margin)
-        self.ax.set_ylim(ymin - dy*margin, ymax + dy*margin)
-        self.ax.set_aspect("equal", adjustable="datalim")
-        self.ax.set_xlabel("Easting (m)")
-        self.ax.set_ylabel("Northing (m)")
-        self.ax.set_title("UTM Triangle Preview")
-
-        
-        scat = self.ax.scatter([], [], s=90, zorder=5)
-
-        
-        max_frames = 30
-        def init():
-            return []
-
-        def animate(fr):
-            self.ax.collections = [c for c in self.ax.collections if isinstance(c, type(self.ax.collections[0]))] if self.ax.collections else []
-            self.ax.lines = []
-            current = int((fr / (max_frames-1)) * 3)  # 0..3 segments
-            frac = (fr / (max_frames-1)) * 3 - current
-            # plot full segments up to current-1
-            drawn_x = []
-            drawn_y = []
-            # segment drawing with smoothing
-            for sidx in range(current):
-                drawn_x += [xs[sidx], xs[sidx+1]]
-                drawn_y += [ys[sidx], ys[sidx+1]]
-            # partial segment
-            if current < 3:
-                x0, y0 = xs[current], ys[current]
-                x1, y1 = xs[current+1], ys[current+1]
-                dxs = x1 - x0
-                dys = y1 - y0
-                drawn_x += [x0, x0 + dxs * frac]
-                drawn_y += [y0, y0 + dys * frac]
-            # if mode area and fully drawn, fill polygon
-            if mode == "area" and fr >= (max_frames-1):
-                self.ax.fill(xs, ys, color="#ff7f50", alpha=0.35, zorder=1)
-                self.ax.plot(xs, ys, color="#d75a3a", linewidth=2, zorder=2)
-                self.ax.scatter(xs[:-1], ys[:-1], s=90, color="#b03a2e", zorder=3)
-            elif mode == "perimeter":
-                self.ax.plot(drawn_x, drawn_y, color=self.accent, linewidth=4, solid_capstyle="round", zorder=4)
-                # draw points always
-                self.ax.scatter(xs[:-1], ys[:-1], s=90, color="#004a99", zorder=5)
-            else:
-                self.ax.plot(drawn_x, drawn_y, color=self.accent, linewidth=3, zorder=4)
-            # labels near points
-            for idx, (px, py) in enumerate(pts):
-                self.ax.text(px, py, f"  {chr(65+idx)}\n  ({px:.2f}, {py:.2f})", fontsize=8, zorder=6)
-            return []
+    def _dataset_loaded(self, fn, result, error):
+        if isinstance(error, TaskCancelled):
+            self.status.config(text="Dataset load cancelled.", fg="#333")
+            return
+        if error is not None:
+            messagebox.showerror("Load Error", f"Could not load dataset:\n{error}")
+            self.status.config(text="Dataset not loaded.", fg=self.warn)
+            return
+        ids, utm, zone, skipped = result
+        self.preview.clear(redraw=False)
+        self.current_utm = None
+        self.dataset_info = f"{os.path.basename(fn)}: UTM zone {zone}, {skipped:,} rows skipped"
+        self.dataset.load(ids, utm, self.mode_var.get())
 
-        ani = animation.FuncAnimation(self.fig, animate, frames=30, interval=40, blit=False, repeat=False)
-        self.canvas.draw_idle()
+    def _on_dataset_view(self, total, visible, polygons, dots, labels):
+        self.status.config(text=f"{self.dataset_info} | {visible:,}/{total:,} in view, "
+                                f"{polygons:,} drawn, {dots:,} dots", fg="#006400")
 
     def on_reset(self):
         for lat_e, lon_e in self.entries:
@@ -524,93 +926,143 @@ class TriangleAnalyzerApp:
         for v in self.angle_vars: v.set("∠A: -")
         self.meta_var.set("Type: - | Orientation: - | Right-angled: -")
         self.status.config(text="Reset.", fg="#333")
-        self.ax.clear(); self.ax.grid(True); self.canvas.draw_idle()
+        # forget the live preview's view of the fields, or the next keystroke
+        # would draw with the coordinates that were just cleared
+        if self._live_after is not None:
+            self.root.after_cancel(self._live_after)
+            self._live_after = None
+        self.live_tasks.cancel_all()
+        self.field_text = [[None, None] for _ in range(3)]
+        self.field_values = [[None, None] for _ in range(3)]
+        self.field_errors = [["", ""] for _ in range(3)]
+        self.point_cache = [None, None, None]
+        self.preview.clear(redraw=False)
+        self.dataset.clear()
         self.current_utm = None
 
+    def on_close(self):
+        # the job threads are not daemons; without this a running export or
+        # dataset load keeps the process alive after the window is gone
+        if self._live_after is not None:
+            self.root.after_cancel(self._live_after)
+            self._live_after = None
+        self.tasks.shutdown()
+        self.live_tasks.shutdown()
+        self.root.destroy()
+
     # -------------------------
     # Exports
     # -------------------------
     def _export_menu(self):
-        if not self.current_utm:
-            messagebox.showwarning("Nothing to Export", "Compute triangle first (Draw & Calculate) before exporting.")
+        has_dataset = self.dataset.tris is not None
+        if not self.current_utm and not has_dataset:
+            messagebox.showwarning("Nothing to Export", "Compute triangle first (Draw & Calculate) or load a dataset before exporting.")
             return
         # simple dialog using filedialog asks
         menu = tk.Toplevel(self.root)
         menu.title("Export Options")
-        menu.geometry("360x220")
+        menu.geometry("360x260")
         menu.transient(self.root)
         menu.grab_set()
 
         tk.Label(menu, text="Choose export format:", font=("Segoe UI", 11, "bold")).pack(pady=8)
-        tk.Button(menu, text="Export PNG (image)", width=30, command=lambda: [menu.destroy(), self._export_png()]).pack(pady=6)
-        tk.Button(menu, text="Export CSV (UTM coords)", width=30, command=lambda: [menu.destroy(), self._export_csv()]).pack(pady=6)
-        tk.Button(menu, text="Export GeoJSON", width=30, command=lambda: [menu.destroy(), self._export_geojson()]).pack(pady=6)
+        if self.current_utm:
+            tk.Button(menu, text="Export PNG (image)", width=30, command=lambda: [menu.destroy(), self._export_png()]).pack(pady=6)
+            tk.Button(menu, text="Export CSV (UTM coords)", width=30, command=lambda: [menu.destroy(), self._export_csv()]).pack(pady=6)
+            tk.Button(menu, text="Export GeoJSON", width=30, command=lambda: [menu.destroy(), self._export_geojson()]).pack(pady=6)
+        if has_dataset:
+            tk.Button(menu, text="Export dataset PNGs (folder)", width=30, command=lambda: [menu.destroy(), self._export_dataset_pngs()]).pack(pady=6)
         tk.Button(menu, text="Close", width=30, command=menu.destroy).pack(pady=6)
 
+    def _on_tasks(self, tasks):
+        task = tasks.active
+        if task is None:
+            self.task_var.set("No background jobs.")
+            self.task_bar.stop()
+            self.task_bar.config(mode="determinate", value=0)
+            self.cancel_btn.state(["disabled"])
+            return
+        if task.total:
+            self.task_bar.stop()
+            self.task_bar.config(mode="determinate", maximum=task.total, value=task.done_count)
+            text = f"{task.name}: {task.done_count:,}/{task.total:,}"
+        else:
+            if str(self.task_bar.cget("mode")) != "indeterminate":
+                self.task_bar.config(mode="indeterminate")
+                self.task_bar.start(15)
+            text = f"{task.name}: {task.done_count:,}" if task.done_count else f"{task.name}..."
+        if task.cancelled:
+            text += " (cancelling)"
+        if len(tasks.tasks) > 1:
+            text += f" | {len(tasks.tasks) - 1} queued"
+        self.task_var.set(text)
+        self.cancel_btn.state(["!disabled" if task.cancellable and not task.cancelled else "disabled"])
+
+    def _export_done(self, what, target):
+        # on_done for export jobs
+        def done(task, result, error):
+            if isinstance(error, TaskCancelled):
+                self.status.config(text=f"{what} export cancelled.", fg="#333")
+            elif error is not None:
+                self.status.config(text=f"{what} export failed.", fg=self.warn)
+                messagebox.showerror("Save Error", str(error))
+            else:
+                n = f"{result:,} files" if isinstance(result, int) else what
+                self.status.config(text=f"{n} saved to {target}", fg="#006400")
+        return done
+
     def _export_png(self):
         fn = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG image", "*.png")], title="Save as PNG")
         if not fn:
             return
-        # draw fully (no animation) then save
-        # We'll re-draw final state
-        pts = self.current_utm
-        xs = [p[0] for p in pts] + [pts[0][0]]
-        ys = [p[1] for p in pts] + [pts[0][1]]
-        mode = self.mode_var.get()
-        self.ax.clear(); self.ax.grid(True)
-        if mode == "area":
-            self.ax.fill(xs, ys, color="#ff7f50", alpha=0.35, zorder=1)
-            self.ax.plot(xs, ys, color="#d75a3a", linewidth=2, zorder=2)
-        else:
-            self.ax.plot(xs, ys, color=self.accent, linewidth=4, zorder=2)
-        for idx, (px, py) in enumerate(pts):
-            self.ax.text(px, py, f"  {chr(65+idx)}\n  ({px:.2f}, {py:.2f})", fontsize=8, zorder=3)
-        self.canvas.draw()
-        try:
-            self.fig.savefig(fn, dpi=300, bbox_inches="tight")
-            messagebox.showinfo("Saved", f"PNG saved to:\n{fn}")
-        except Exception as e:
-            messagebox.showerror("Save Error", str(e))
+        # rendered off-screen on the worker; the live preview is untouched
+        facecolor = "#2b2b3d" if self.dark_mode else "#ffffff"
+        self.tasks.submit("PNG export", render_triangle_png, fn, list(self.current_utm), self.mode_var.get(),
+                          self.accent, 300, facecolor, on_done=self._export_done("PNG", fn))
+
+    def _export_dataset_pngs(self):
+        out_dir = filedialog.askdirectory(title="Folder for dataset PNGs", mustexist=False)
+        if not out_dir:
+            return
+        import multiprocessing
+        items = list(zip(self.dataset.ids, self.dataset.tris))
+        # spawn: the workers must not inherit the Tk interpreter
+        self.tasks.submit("Dataset PNGs", render_pngs_parallel, items, out_dir, self.mode_var.get(), self.accent,
+                          150, total=len(items), mp_context=multiprocessing.get_context("spawn"), progress=True,
+                          on_done=self._export_done("PNG", out_dir))
 
     def _export_csv(self):
         fn = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV file", "*.csv")], title="Save CSV")
         if not fn:
             return
-        try:
+        rows = [[chr(65+idx), f"{lat:.8f}", f"{lon:.8f}", f"{x:.4f}", f"{y:.4f}"]
+                for idx, ((lat, lon), (x, y)) in enumerate(zip(self.current_latlon, self.current_utm))]
+
+        def write():
             with open(fn, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Point", "Lat", "Lon", "UTM_Easting", "UTM_Northing"])
-                for idx, ((lat, lon), (x, y)) in enumerate(zip(self.current_latlon, self.current_utm)):
-                    writer.writerow([chr(65+idx), f"{lat:.8f}", f"{lon:.8f}", f"{x:.4f}", f"{y:.4f}"])
-            messagebox.showinfo("Saved", f"CSV saved to:\n{fn}")
-        except Exception as e:
-            messagebox.showerror("Save Error", str(e))
+                write_csv_rows(f, ["Point", "Lat", "Lon", "UTM_Easting", "UTM_Northing"], rows)
+        self.tasks.submit("CSV export", write, on_done=self._export_done("CSV", fn))
 
     def _export_geojson(self):
         fn = filedialog.asksaveasfilename(defaultextension=".geojson", filetypes=[("GeoJSON", "*.geojson")], title="Save GeoJSON")
         if not fn:
             return
-        try:
-            # Create polygon in lon/lat order from original latlon list
-            coords = [[lon, lat] for (lat, lon) in self.current_latlon]
-            coords.append([self.current_latlon[0][1], self.current_latlon[0][0]])
-            feature = {
-                "type": "Feature",
-                "properties": {
-                    "generated_by": "TriangleAnalyzer",
-                    "timestamp": datetime.utcnow().isoformat() + "Z"
-                },
-                "geometry": {
-                    "type": "Polygon",
-                    "coordinates": [coords]
-                }
-            }
-            fc = {"type": "FeatureCollection", "features": [feature]}
+        # Create polygon in lon/lat order from original latlon list
+        feature = {
+            "type": "Feature",
+            "properties": {
+                "generated_by": "TriangleAnalyzer",
+                "timestamp": datetime.utcnow().isoformat() + "Z"
+            },
+            "geometry": geojson_polygon(self.current_latlon)
+        }
+
+        def write():
             with open(fn, "w", encoding="utf-8") as f:
-                json.dump(fc, f, ensure_ascii=False, indent=2)
-            messagebox.showinfo("Saved", f"GeoJSON saved to:\n{fn}")
-        except Exception as e:
-            messagebox.showerror("Save Error", str(e))
+                writer = GeoJsonWriter(f)
+                writer.write_features([feature])
+                writer.close()
+        self.tasks.submit("GeoJSON export", write, on_done=self._export_done("GeoJSON", fn))
 
     # -------------------------
     # Dark mode toggle (simple)
@@ -642,10 +1094,728 @@ class TriangleAnalyzerApp:
 
 
 
+# -------------------------
+# Headless batch processing
+# -------------------------
+# A chunk is (ids, latlon) where latlon is an (n,3,2) array of (lat, lon)
+# for points A, B, C. Readers never hold more than one chunk in memory.
+CSV_COORD_COLUMNS = ["lat1", "lon1", "lat2", "lon2", "lat3", "lon3"]
+GEOJSON_BLOCK_SIZE = 1 << 20
+
+def _float_or_nan(s):
+    ok, v = validate_number_string(s)
+    return v if ok else np.nan
+
+def _coords_to_array(rows):
+    try:
+        arr = np.array(rows, dtype=float)
+    except ValueError:
+        # slow path only for chunks that contain junk; bad cells become NaN
+        arr = np.array([[_float_or_nan(v) for v in r] for r in rows], dtype=float)
+    return arr.reshape(-1, 3, 2)
+
+def _parse_csv_block(lines, cols, id_col, start):
+    # Numeric columns go through np.loadtxt's C parser; only the id column is
+    # split in Python. Blocks with quotes or junk cells fall back to the csv
+    # module, where bad cells become NaN. Blank lines never get here.
+    coords = None
+    if not any(b'"' in line for line in lines):
+        try:
+            coords = np.loadtxt(lines, delimiter=",", usecols=cols, dtype=float, ndmin=2, comments=None)
+        except ValueError:
+            coords = None
+        if coords is not None and len(coords) != len(lines):
+            coords = None  # loadtxt skipped a whitespace-only line
+    if coords is not None:
+        if id_col is None:
+            ids = [str(start + i + 1) for i in range(len(lines))]
+        else:
+            ids = [line.rstrip(b"\r\n").split(b",")[id_col].decode("utf-8") for line in lines]
+        return ids, coords.reshape(-1, 3, 2)
+    block = list(csv.reader(line.decode("utf-8") for line in lines))
+    ids = [(r[id_col] if id_col < len(r) else "") if id_col is not None else str(start + i + 1)
+           for i, r in enumerate(block)]
+    rows = [[(r[c] if c < len(r) else "") for c in cols] for r in block]
+    return ids, _coords_to_array(rows)
+
+def iter_csv_chunks(path, chunk_size):
+    with open(path, "rb") as f:
+        first_line = f.readline()
+        if not first_line:
+            return
+        header = next(csv.reader([first_line.decode("utf-8")]), [])
+        names = [h.strip().lower() for h in header]
+        if all(c in names for c in CSV_COORD_COLUMNS):
+            cols = [names.index(c) for c in CSV_COORD_COLUMNS]
+            id_col = names.index("id") if "id" in names else None
+            first = []
+        else:
+            # no header: the first six columns are lat1,lon1,...,lat3,lon3
+            cols = list(range(6))
+            id_col = None
+            first = [first_line]
+        # blank lines are skipped, as csv.DictReader does
+        lines = (line for line in itertools.chain(first, f) if line.strip(b"\r\n"))
+        start = 0
+        while True:
+            block = list(itertools.islice(lines, chunk_size))
+            if not block:
+                break
+            yield _parse_csv_block(block, cols, id_col, start)
+            start += len(block)
+
+# Packed binary input: little-endian float64 (lat, lon) pairs, three points
+# (48 bytes) per triangle, no header. The file is memory-mapped and chunks
+# are read-only views into it, so nothing is parsed or copied up front.
+# A .npy file of shape (N,6) or (N,3,2) is mapped the same way.
+BINARY_EXTENSIONS = (".bin", ".f64", ".raw", ".npy")
+TRIANGLE_RECORD_SIZE = 48
+
+def map_triangle_file(path):
+    if path.lower().endswith(".npy"):
+        arr = np.load(path, mmap_mode="r")
+        if arr.size % 6 or arr.dtype.kind != "f":
+            raise ValueError(f"{path}: expected float (N,6) or (N,3,2) array, got {arr.dtype} {arr.shape}")
+        return arr.reshape(-1, 3, 2)
+    size = os.path.getsize(path)
+    if size % TRIANGLE_RECORD_SIZE:
+        raise ValueError(f"{path}: size {size} is not a multiple of {TRIANGLE_RECORD_SIZE} bytes "
+                         "(6 float64 per triangle)")
+    if not size:
+        return np.empty((0, 3, 2))
+    return np.memmap(path, dtype="<f8", mode="r", shape=(size // TRIANGLE_RECORD_SIZE, 3, 2))
+
+def iter_binary_chunks(path, chunk_size):
+    tris = map_triangle_file(path)
+    for start in range(0, len(tris), chunk_size):
+        view = tris[start:start + chunk_size]
+        # ids are 1-based row numbers, as for CSV input without an id column
+        yield range(start + 1, start + len(view) + 1), view
+
+def _iter_geojson_features(f):
+    # Incremental scan of a FeatureCollection's "features" array, one feature
+    # at a time, so the whole document is never loaded.
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = -1
+    eof = False
+    while pos < 0:
+        block = f.read(GEOJSON_BLOCK_SIZE)
+        if not block:
+            return
+        buf += block
+        key = buf.find('"features"')
+        if key >= 0:
+            pos = buf.find("[", key)
+    pos += 1
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            if pos >= len(buf):
+                raise ValueError
+            obj, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise ValueError("truncated GeoJSON features array")
+            block = f.read(GEOJSON_BLOCK_SIZE)
+            eof = not block
+            buf = buf[pos:] + block
+            pos = 0
+            continue
+        yield obj
+        pos = end
+
+def _iter_geojson_seq(f):
+    # newline-delimited features (GeoJSONSeq / ndjson)
+    for line in f:
+        line = line.strip().lstrip("\x1e")
+        if line:
+            yield json.loads(line)
+
+def _feature_triangle(feature, fallback_id):
+    fid = feature.get("id")
+    if fid is None:
+        fid = (feature.get("properties") or {}).get("id", fallback_id)
+    geom = feature.get("geometry") or {}
+    coords = geom.get("coordinates") or []
+    if geom.get("type") == "Polygon" and coords:
+        ring = coords[0]
+    elif geom.get("type") == "MultiPoint":
+        ring = coords
+    else:
+        ring = []
+    if len(ring) < 3:
+        return str(fid), [[np.nan, np.nan]] * 3
+    # GeoJSON stores lon, lat; chunks are lat, lon
+    return str(fid), [[float(p[1]), float(p[0])] for p in ring[:3]]
+
+def iter_geojson_chunks(path, chunk_size):
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".geojsonl", ".geojsons", ".ndjson", ".jsonl")):
+            features = _iter_geojson_seq(f)
+        else:
+            features = _iter_geojson_features(f)
+        start = 0
+        while True:
+            block = list(itertools.islice(features, chunk_size))
+            if not block:
+                break
+            pairs = [_feature_triangle(feat, str(start + i + 1)) for i, feat in enumerate(block)]
+            yield [p[0] for p in pairs], np.array([p[1] for p in pairs], dtype=float).reshape(-1, 3, 2)
+            start += len(block)
+
+def iter_triangle_chunks(path, chunk_size=50000):
+    if path.lower().endswith(BINARY_EXTENSIONS):
+        return iter_binary_chunks(path, chunk_size)
+    if path.lower().endswith((".geojson", ".json", ".geojsonl", ".geojsons", ".ndjson", ".jsonl")):
+        return iter_geojson_chunks(path, chunk_size)
+    return iter_csv_chunks(path, chunk_size)
+
+def load_dataset_utm(path, chunk_size=50000, progress=None):
+    # Whole file as one (N,3,2) array for display. Every point is projected
+    # into the zone of the median longitude so all triangles share one plane;
+    # rows with missing or out-of-range coordinates are skipped.
+    # progress(rows, None) is called per chunk read, then (done, total) while
+    # projecting.
+    ids, parts, skipped, rows = [], [], 0, 0
+    for chunk_ids, latlon in iter_triangle_chunks(path, chunk_size):
+        ok = latlon_in_range(latlon)
+        skipped += int((~ok).sum())
+        ids.extend(i for i, keep in zip(chunk_ids, ok) if keep)
+        parts.append(latlon[ok])
+        rows += len(latlon)
+        if progress:
+            progress(rows, None)
+    if not ids:
+        raise ValueError(f"no valid triangles in {path}")
+    latlon = np.concatenate(parts)
+    zone = utm_zone(float(np.median(latlon[..., 1])))
+    transformer = get_transformer_for_zone(zone)
+    utm = np.empty_like(latlon)
+    for start in range(0, len(latlon), chunk_size):
+        part = latlon[start:start + chunk_size]
+        utm[start:start + chunk_size, :, 0], utm[start:start + chunk_size, :, 1] = \
+            transformer.transform(part[..., 1], part[..., 0])
+        if progress:
+            progress(min(start + chunk_size, len(latlon)), len(latlon))
+    return ids, utm, zone, skipped
+
+# Bulk validation: the checks on_draw makes for one triangle, as masks.
+MIN_EDGE_M = 1e-3  # "extremely close (less than 1 mm)"
+MAX_EDGE_M = 3e6   # "> 3000 km"; on_draw asks, batch output flags the row
+STATUS_NAMES = ("ok", "out_of_range", "not_triangle", "degenerate", "long_edge")  # index == status code
+
+def triangle_status(in_range, res):
+    # precedence follows on_draw: bad input, then edges under 1 mm, then
+    # collinear points; long edges only flag an otherwise valid triangle
+    shortest = np.minimum(np.minimum(res["ab"], res["bc"]), res["ca"])
+    longest = np.maximum(np.maximum(res["ab"], res["bc"]), res["ca"])
+    code = np.zeros(len(in_range), dtype=np.int8)
+    code[longest > MAX_EDGE_M] = 4
+    code[res["area"] <= 1e-6] = 2
+    code[shortest < MIN_EDGE_M] = 3
+    code[~in_range] = 1
+    return code
+
+# "utm": planar metrics in each point's UTM zone (the GUI's original numbers);
+# "geodesic": WGS84 ellipsoid, no projection, so no zone bucketing at all
+ENGINES = ("utm", "geodesic")
+
+def process_chunk(latlon, engine="utm"):
+    latlon = np.asarray(latlon, dtype=float)
+    lats, lons = latlon[..., 0], latlon[..., 1]
+    in_range = latlon_in_range(latlon)
+    # out-of-range rows are computed at 0,0 and reported as invalid
+    safe_lats = np.where(in_range[:, None], lats, 0.0)
+    safe_lons = np.where(in_range[:, None], lons, 0.0)
+    if engine == "geodesic":
+        zones = utm_zones(safe_lons)  # reported, never used
+        res = batch_geodesic_metrics(np.stack([safe_lats, safe_lons], axis=-1))
+    else:
+        east, north, zones = latlon_to_utm_bulk(safe_lats, safe_lons)
+        utm = np.stack([east, north], axis=-1)
+        res = batch_triangle_metrics(utm)
+    res["zone"] = zones[:, 0]
+    res["multi_zone"] = (zones != zones[:, :1]).any(axis=1)
+    res["status_code"] = triangle_status(in_range, res)
+    res["status"] = np.asarray(STATUS_NAMES)[res["status_code"]]
+    return res
+
+BATCH_CSV_COLUMNS = ["id", "status", "zone", "multi_zone", "perimeter_m", "area_m2",
+                     "ab_m", "bc_m", "ca_m", "angle_a", "angle_b", "angle_c", "type", "right"]
+
+def result_rows(ids, res):
+    cols = zip(ids, res["status"], res["zone"].tolist(), res["multi_zone"].tolist(),
+               res["perimeter"].tolist(), res["area"].tolist(),
+               res["ab"].tolist(), res["bc"].tolist(), res["ca"].tolist(),
+               res["angle_a"].tolist(), res["angle_b"].tolist(), res["angle_c"].tolist(),
+               res["type_code"].tolist(), res["right"].tolist())
+    for (tid, status, zone, multi, per, area, ab, bc, ca, ang_a, ang_b, ang_c, tcode, right) in cols:
+        if status == "out_of_range":
+            yield [tid, status, "", "", "", "", "", "", "", "", "", "", "", ""]
+            continue
+        yield [tid, status, zone, int(multi), f"{per:.3f}", f"{area:.3f}",
+               f"{ab:.3f}", f"{bc:.3f}", f"{ca:.3f}",
+               f"{ang_a:.3f}", f"{ang_b:.3f}", f"{ang_c:.3f}", TYPE_NAMES[tcode], int(right)]
+
+def result_records(ids, res):
+    # same values as result_rows, typed for JSON (None for invalid rows)
+    names = BATCH_CSV_COLUMNS[2:]
+    for row in result_rows(ids, res):
+        if row[1] == "out_of_range":
+            yield row[0], row[1], dict.fromkeys(names)
+            continue
+        zone, multi, *metrics, ttype, right = row[2:]
+        yield row[0], row[1], dict(zip(names, [zone, bool(multi)] + [float(v) for v in metrics] + [ttype, bool(right)]))
+
+
+# -------------------------
+# Streaming writers
+# -------------------------
+# Output is produced chunk by chunk, so memory stays flat however many
+# triangles go through. Result writers split the work in two:
+# format_chunk(ids, latlon, res) is pure and can run in a pool worker,
+# write_formatted(payload) appends its result to the output in order.
+def write_csv_rows(out, header, rows):
+    writer = csv.writer(out)
+    writer.writerow(header)
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+    return n
+
+def geojson_polygon(latlon):
+    # closed ring in lon/lat order
+    ring = [[lon, lat] for lat, lon in latlon]
+    return {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+
+def dump_feature(feature):
+    return json.dumps(feature, separators=(",", ":"), ensure_ascii=False)
+
+class GeoJsonWriter:
+    # one FeatureCollection, one compact feature per line
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+        out.write('{"type":"FeatureCollection","features":[\n')
+
+    def write_text(self, text, n):
+        # text: n already-encoded features joined with ",\n"
+        if not n:
+            return
+        if self.count:
+            self.out.write(",\n")
+        self.out.write(text)
+        self.count += n
+
+    def write_features(self, features):
+        for feature in features:
+            self.write_text(dump_feature(feature), 1)
+        return self.count
+
+    def close(self):
+        self.out.write("\n]}\n")
+        self.out.flush()
+
+
+class ResultWriter:
+    def write(self, ids, latlon, res):
+        self.write_formatted(self.format_chunk(ids, latlon, res))
+
+    def close(self):
+        pass
+
+
+class CsvResultWriter(ResultWriter):
+    def __init__(self, out):
+        self.out = out
+        csv.writer(out).writerow(BATCH_CSV_COLUMNS)
+
+    @staticmethod
+    def format_chunk(ids, latlon, res):
+        # one CSV string per chunk is far cheaper to pickle than lists of cells
+        buf = io.StringIO()
+        csv.writer(buf).writerows(result_rows(ids, res))
+        return buf.getvalue()
+
+    def write_formatted(self, text):
+        self.out.write(text)
+        self.out.flush()
+
+
+class GeoJsonResultWriter(ResultWriter):
+    def __init__(self, out):
+        self.geojson = GeoJsonWriter(out)
+
+    @staticmethod
+    def format_chunk(ids, latlon, res):
+        features = []
+        for (tid, status, props), pts in zip(result_records(ids, res), latlon.tolist()):
+            geometry = None if status == "out_of_range" else geojson_polygon(pts)
+            features.append(dump_feature({"type": "Feature", "id": tid, "geometry": geometry,
+                                          "properties": dict(status=status, **props)}))
+        return ",\n".join(features), len(features)
+
+    def write_formatted(self, payload):
+        self.geojson.write_text(*payload)
+        self.geojson.out.flush()
+
+    def close(self):
+        self.geojson.close()
+
+
+# Columnar results: a directory holding one .npy file per column plus
+# meta.json. The arrays are appended chunk by chunk after a fixed-size
+# header that is rewritten with the final length on close, so the files are
+# ordinary .npy files that np.load(..., mmap_mode="r") opens without parsing.
+# Ids are variable-length, so they are stored as concatenated UTF-8 bytes
+# (id_data) plus N+1 offsets (id_offsets).
+COLUMNAR_COLUMNS = [
+    ("lat1", "<f8"), ("lon1", "<f8"), ("lat2", "<f8"), ("lon2", "<f8"), ("lat3", "<f8"), ("lon3", "<f8"),
+    ("status", "i1"), ("zone", "<i2"), ("multi_zone", "?"),
+    ("perimeter", "<f8"), ("area", "<f8"), ("ab", "<f8"), ("bc", "<f8"), ("ca", "<f8"),
+    ("angle_a", "<f8"), ("angle_b", "<f8"), ("angle_c", "<f8"), ("type_code", "i1"), ("right", "?"),
+    ("id_offsets", "<i8"), ("id_data", "u1"),
+]
+NPY_HEADER_SIZE = 128
+
+def npy_header(dtype, length):
+    d = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(np.dtype(dtype)), length)
+    size = NPY_HEADER_SIZE - 10  # magic(6) + version(2) + header length(2)
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", size) + (d.ljust(size - 1) + "\n").encode("latin1")
+
+
+class ColumnarResultWriter(ResultWriter):
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.count = 0
+        self.lengths = dict.fromkeys((name for name, _ in COLUMNAR_COLUMNS), 0)
+        self.files = {}
+        for name, dtype in COLUMNAR_COLUMNS:
+            f = open(os.path.join(path, name + ".npy"), "wb")
+            f.write(npy_header(dtype, 0))
+            self.files[name] = f
+        self._append("id_offsets", np.zeros(1, dtype="<i8"))
+        self.id_bytes = 0
+
+    @staticmethod
+    def format_chunk(ids, latlon, res):
+        flat = np.asarray(latlon, dtype=float).reshape(-1, 6)
+        cols = dict(zip(("lat1", "lon1", "lat2", "lon2", "lat3", "lon3"), flat.T))
+        cols["status"] = res["status_code"]
+        for name in ("zone", "multi_zone", "perimeter", "area", "ab", "bc", "ca",
+                     "angle_a", "angle_b", "angle_c", "type_code", "right"):
+            cols[name] = res[name]
+        encoded = [str(i).encode("utf-8") for i in ids]
+        cols["id_data"] = np.frombuffer(b"".join(encoded), dtype="u1")
+        cols["id_lengths"] = np.fromiter(map(len, encoded), dtype="<i8", count=len(encoded))
+        return cols
+
+    def _append(self, name, values):
+        dtype = dict(COLUMNAR_COLUMNS)[name]
+        values = np.ascontiguousarray(values, dtype=dtype)
+        self.files[name].write(values.tobytes())
+        self.lengths[name] += len(values)
+
+    def write_formatted(self, cols):
+        offsets = self.id_bytes + np.cumsum(cols["id_lengths"])
+        self.id_bytes = int(offsets[-1]) if len(offsets) else self.id_bytes
+        self._append("id_offsets", offsets)
+        for name, _ in COLUMNAR_COLUMNS:
+            if name != "id_offsets":
+                self._append(name, cols[name])
+        self.count += len(cols["status"])
+
+    def close(self):
+        for name, dtype in COLUMNAR_COLUMNS:
+            f = self.files[name]
+            f.seek(0)
+            f.write(npy_header(dtype, self.lengths[name]))
+            f.close()
+        meta = {"format": "mosalas-columnar", "version": 1, "count": self.count,
+                "columns": [name for name, _ in COLUMNAR_COLUMNS],
+                "status_names": list(STATUS_NAMES), "type_names": list(TYPE_NAMES)}
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+
+def load_columnar(path, mmap_mode="r"):
+    # {column: array} memory-mapped by default, plus the meta.json dict
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    cols = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in meta["columns"]}
+    return cols, meta
+
+def columnar_ids(cols, start=0, stop=None):
+    offsets, data = cols["id_offsets"], cols["id_data"]
+    stop = len(offsets) - 1 if stop is None else stop
+    return [bytes(data[offsets[i]:offsets[i+1]]).decode("utf-8") for i in range(start, stop)]
+
+
+RESULT_WRITERS = {"csv": CsvResultWriter, "geojson": GeoJsonResultWriter, "npy": ColumnarResultWriter}
+
+def run_batch(input_path, out, chunk_size=50000, fmt="csv", engine="utm"):
+    # out: a text stream for csv/geojson, a directory path for npy
+    writer = RESULT_WRITERS[fmt](out)
+    total = 0
+    for ids, latlon in iter_triangle_chunks(input_path, chunk_size):
+        writer.write(ids, latlon, process_chunk(latlon, engine))
+        total += len(ids)
+    writer.close()
+    return total
+
+
+# Multi-core execution: chunks are sharded over a process pool and written
+# back in input order. Every worker builds its transformer cache once.
+def _batch_worker_init(prewarm_zones):
+    if prewarm_zones:
+        TRANSFORMER_POOL.prewarm(prewarm_zones)
+
+def _batch_worker_run(ids, latlon, fmt="csv", engine="utm"):
+    # output is formatted in the worker; the parent only appends it
+    t0 = time.perf_counter()
+    payload = RESULT_WRITERS[fmt].format_chunk(ids, latlon, process_chunk(latlon, engine))
+    return os.getpid(), len(ids), time.perf_counter() - t0, payload
+
+def run_batch_parallel(input_path, out, chunk_size=50000, workers=None, prewarm_zones=ALL_UTM_ZONES, fmt="csv",
+                       engine="utm"):
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+    writer = RESULT_WRITERS[fmt](out)
+    total = 0
+    worker_stats = {}  # pid -> [triangles, busy seconds, chunks]
+    # a bounded window of in-flight chunks keeps memory flat on huge inputs
+    max_pending = workers * 2
+    pending = deque()
+
+    def drain_one():
+        pid, n, busy, payload = pending.popleft().result()
+        writer.write_formatted(payload)
+        st = worker_stats.setdefault(pid, [0, 0.0, 0])
+        st[0] += n
+        st[1] += busy
+        st[2] += 1
+        return n
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_batch_worker_init,
+                             initargs=(list(prewarm_zones or ()),)) as pool:
+        for ids, latlon in iter_triangle_chunks(input_path, chunk_size):
+            pending.append(pool.submit(_batch_worker_run, ids, latlon, fmt, engine))
+            if len(pending) >= max_pending:
+                total += drain_one()
+        while pending:
+            total += drain_one()
+    writer.close()
+    return total, worker_stats
+
+def format_worker_report(worker_stats):
+    lines = ["worker      chunks  triangles    busy_s     tri/s"]
+    for pid, (n, busy, chunks) in sorted(worker_stats.items()):
+        rate = n / busy if busy > 0 else 0.0
+        lines.append(f"{pid:<10} {chunks:>7} {n:>10} {busy:>9.2f} {rate:>9,.0f}")
+    return "\n".join(lines)
+
+def png_name(item_id, used=None):
+    # used: names already handed out in this run (lower-cased, for
+    # case-insensitive file systems); ids that sanitize to the same name
+    # ("x/0", "x_0") get -2, -3, ... instead of overwriting each other
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(item_id)) or "triangle"
+    name = safe + ".png"
+    if used is not None:
+        n = 1
+        while name.lower() in used:
+            n += 1
+            name = "%s-%d.png" % (safe, n)
+        used.add(name.lower())
+    return name
+
+def _png_worker_run(items, out_dir, mode, color, dpi):
+    renderer = offscreen_renderer()
+    for name, pts in items:
+        renderer.render(os.path.join(out_dir, name), pts, mode, color, dpi, tight=False)
+    return len(items)
+
+def render_pngs_parallel(items, out_dir, mode="perimeter", color="#2b7cff", dpi=150, workers=None,
+                         total=None, progress=None, mp_context=None, per_task=16):
+    # items: iterable of (id, [(x, y)] * 3) in projected metres; one PNG per
+    # item in out_dir. progress(done, total) runs in the calling thread after
+    # every finished task (total is None when the caller does not know it).
+    from concurrent.futures import ProcessPoolExecutor
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    max_pending = workers * 2
+    pending = deque()
+    used = set()
+
+    def drain_one():
+        nonlocal done
+        done += pending.popleft().result()
+        if progress:
+            progress(done, total)
+
+    items = iter(items)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        try:
+            while True:
+                block = [(png_name(i, used), [(float(x), float(y)) for x, y in pts])
+                         for i, pts in itertools.islice(items, per_task)]
+                if not block:
+                    break
+                pending.append(pool.submit(_png_worker_run, block, out_dir, mode, color, dpi))
+                if len(pending) >= max_pending:
+                    drain_one()
+            while pending:
+                drain_one()
+        except BaseException:
+            # progress may raise to stop early; drop whatever has not started
+            for f in pending:
+                f.cancel()
+            raise
+    return done
+
+def iter_utm_triangles(input_path, chunk_size=50000, skipped=None):
+    # (id, [(x, y)] * 3) per valid row, each point in its own zone like on_draw
+    for ids, latlon in iter_triangle_chunks(input_path, chunk_size):
+        ok = latlon_in_range(latlon)
+        if skipped is not None:
+            skipped[0] += int((~ok).sum())
+        good = latlon[ok]
+        east, north, _ = latlon_to_utm_bulk(good[..., 0], good[..., 1])
+        utm = np.stack([east, north], axis=-1)
+        for item_id, pts in zip((i for i, keep in zip(ids, ok) if keep), utm):
+            yield item_id, pts
+
+def png_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mosalas.py png",
+        description="Render one PNG preview per triangle of a CSV / GeoJSON batch.")
+    parser.add_argument("input", help="CSV with lat1,lon1,lat2,lon2,lat3,lon3[,id] columns, or (line-delimited) GeoJSON")
+    parser.add_argument("-o", "--output-dir", required=True, help="directory for <id>.png files")
+    parser.add_argument("--mode", choices=("perimeter", "area"), default="perimeter")
+    parser.add_argument("--dpi", type=int, default=150, help="image resolution (default: 150)")
+    parser.add_argument("-j", "--workers", type=int, default=0, help="worker processes; 0 = one per CPU (default)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="triangles read per chunk (default: 50000)")
+    args = parser.parse_args(argv)
+    if args.workers < 0:
+        parser.error("--workers must be >= 0")
+
+    skipped = [0]
+
+    def progress(done, total):
+        print(f"\r{done} images", end="", file=sys.stderr, flush=True)
+
+    t0 = time.perf_counter()
+    n = render_pngs_parallel(iter_utm_triangles(args.input, args.chunk_size, skipped), args.output_dir,
+                             args.mode, dpi=args.dpi, workers=args.workers or None, progress=progress)
+    elapsed = time.perf_counter() - t0
+    print(f"\r{n} images in {elapsed:.2f}s ({skipped[0]} rows skipped)", file=sys.stderr)
+    return 0
+
+def build_dataset_index(path, cell_size=None, chunk_size=50000, progress=None):
+    # projected the same way as the dataset view (one UTM zone for the file);
+    # the zone is stored with the index so lat/lon queries can follow it
+    ids, utm, zone, skipped = load_dataset_utm(path, chunk_size, progress)
+    return TriangleGridIndex(utm, ids=[str(i) for i in ids], cell_size=cell_size, zone=zone), skipped
+
+def index_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mosalas.py index",
+        description="Build a spatial index file for point / bounding box lookups (soap.py --index).")
+    parser.add_argument("input", help="CSV with lat1,lon1,lat2,lon2,lat3,lon3[,id] columns, (line-delimited) GeoJSON or binary")
+    parser.add_argument("-o", "--output", required=True, help="index file to write (.npz)")
+    parser.add_argument("--cell-size", type=float, default=None,
+                        help="grid cell in metres (default: about one typical triangle)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="triangles read per chunk (default: 50000)")
+    args = parser.parse_args(argv)
+    if args.cell_size is not None and args.cell_size <= 0:
+        parser.error("--cell-size must be > 0")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be >= 1")
+
+    t0 = time.perf_counter()
+    index, skipped = build_dataset_index(args.input, args.cell_size, args.chunk_size)
+    index.save(args.output)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(index)} triangles indexed in {elapsed:.2f}s ({skipped} rows skipped): UTM zone {index.zone}, "
+          f"{index.nx}x{index.ny} cells of {index.cell:.1f} m, {len(index.items)} entries", file=sys.stderr)
+    return 0
+
+def batch_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="mosalas.py batch",
+        description="Headless triangle analysis (WGS84 -> UTM or geodesic) for CSV / GeoJSON inputs.")
+    parser.add_argument("input", help="CSV with lat1,lon1,lat2,lon2,lat3,lon3[,id] columns, or (line-delimited) GeoJSON")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output path (default: stdout); a directory for --format npy")
+    parser.add_argument("-f", "--format", choices=sorted(RESULT_WRITERS), default="csv",
+                        help="csv (default), geojson (FeatureCollection, one feature per line) or "
+                             "npy (directory of memory-mappable columns)")
+    parser.add_argument("-e", "--engine", choices=ENGINES, default="utm",
+                        help="utm (default): planar metrics in each point's UTM zone; "
+                             "geodesic: lengths, angles and area on the WGS84 ellipsoid")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="triangles per chunk (default: 50000)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="worker processes; 0 = one per CPU (default: 1, no pool)")
+    parser.add_argument("--prewarm", default="all",
+                        help="UTM zones each worker builds at startup: 'all', 'none' or e.g. '38,39,40'")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be >= 1")
+    if args.workers < 0:
+        parser.error("--workers must be >= 0")
+    if args.format == "npy" and args.output == "-":
+        parser.error("--format npy needs an output directory (-o DIR)")
+    if args.prewarm == "all":
+        prewarm_zones = ALL_UTM_ZONES
+    elif args.prewarm == "none":
+        prewarm_zones = []
+    else:
+        try:
+            prewarm_zones = [int(z) for z in args.prewarm.split(",") if z.strip()]
+        except ValueError:
+            parser.error("--prewarm must be 'all', 'none' or a comma separated list of zones")
+    if args.engine == "geodesic":
+        prewarm_zones = []  # nothing is projected
+
+    def run(out):
+        if args.workers == 1:
+            return run_batch(args.input, out, args.chunk_size, args.format, args.engine), None
+        return run_batch_parallel(args.input, out, args.chunk_size, args.workers or None, prewarm_zones, args.format,
+                                  args.engine)
+
+    t0 = time.perf_counter()
+    if args.output == "-":
+        total, worker_stats = run(sys.stdout)
+    elif args.format == "npy":
+        total, worker_stats = run(args.output)
+    else:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            total, worker_stats = run(out)
+    elapsed = time.perf_counter() - t0
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"{total} triangles in {elapsed:.2f}s ({rate:,.0f}/s)", file=sys.stderr)
+    if worker_stats:
+        print(format_worker_report(worker_stats), file=sys.stderr)
+    return 0
+
+
 def main():
+    _import_gui()
     root = tk.Tk()
     app = TriangleAnalyzerApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "png":
+        sys.exit(png_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        sys.exit(index_main(sys.argv[2:]))
     main()
\ No newline at end of file
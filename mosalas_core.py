@@ -0,0 +1,631 @@
+### mrym zolfaqari ###
+#wenet
+
+# Geometry and UTM projection shared by the GUI (mosalas.py) and the SOAP
+# service (prj 9/soap.py). Only the standard library is imported here; numpy
+# and pyproj are imported by the functions that need them, so scalar callers
+# (dist, area_from_coords, ...) start in a few milliseconds.
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+# Utilities: geometry & UTM
+ALL_UTM_ZONES = range(1, 61)
+
+def utm_zone(lon):
+    return min(int((lon + 180) / 6) + 1, 60)  # lon = 180 belongs to zone 60
+
+def utm_zones(lons):
+    # utm_zone for an array of longitudes
+    import numpy as np
+    return np.minimum(((np.asarray(lons, dtype=float) + 180) / 6).astype(np.int64) + 1, 60)
+
+def build_utm_transformer(zone):
+    from pyproj import Transformer
+    crs_to = f"+proj=utm +zone={zone} +datum=WGS84 +units=m +no_defs"
+    return Transformer.from_crs("EPSG:4326", crs_to, always_xy=True)
+
+
+class TransformerPool:
+    # pyproj Transformers must not be shared between threads, so every thread
+    # keeps its own LRU of zone -> Transformer; only the counters are shared.
+    def __init__(self, maxsize=60):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.build_time = 0.0
+
+    def _cache(self):
+        cache = getattr(self._local, "cache", None)
+        if cache is None:
+            cache = self._local.cache = OrderedDict()
+        return cache
+
+    def get(self, zone):
+        cache = self._cache()
+        t = cache.get(zone)
+        if t is not None:
+            cache.move_to_end(zone)
+            with self._lock:
+                self.hits += 1
+            return t
+        t0 = time.perf_counter()
+        t = build_utm_transformer(zone)
+        elapsed = time.perf_counter() - t0
+        cache[zone] = t
+        evicted = 0
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            evicted += 1
+        with self._lock:
+            self.misses += 1
+            self.evictions += evicted
+            self.build_time += elapsed
+        return t
+
+    def prewarm(self, zones=None):
+        # warms the calling thread; use as a worker/thread-pool initializer
+        for zone in (ALL_UTM_ZONES if zones is None else zones):
+            self.get(int(zone))
+
+    def clear(self):
+        self._cache().clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "build_time_s": self.build_time,
+                "maxsize": self.maxsize,
+                "cached_in_thread": len(self._cache()),
+            }
+
+
+TRANSFORMER_POOL = TransformerPool()
+
+def get_transformer_for_zone(zone):
+    return TRANSFORMER_POOL.get(zone)
+
+def get_transformer_for_lon(lon):
+    return get_transformer_for_zone(utm_zone(lon))
+
+def latlon_to_utm(lat, lon):
+    t = get_transformer_for_lon(lon)
+    x, y = t.transform(lon, lat)
+    return (float(x), float(y), utm_zone(lon))
+
+def latlon_to_utm_bulk(lats, lons):
+    # one transform call per UTM zone instead of one per point
+    import numpy as np
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if lats.shape != lons.shape:
+        raise ValueError(f"lat/lon shape mismatch: {lats.shape} vs {lons.shape}")
+    shape = lats.shape
+    lats = lats.ravel()
+    lons = lons.ravel()
+    zones = utm_zones(lons)
+    eastings = np.empty(lats.shape, dtype=float)
+    northings = np.empty(lats.shape, dtype=float)
+    if lats.size:
+        # stable sort keeps each zone's points contiguous so every group is a slice
+        order = np.argsort(zones, kind="stable")
+        sorted_zones = zones[order]
+        starts = np.flatnonzero(np.r_[True, sorted_zones[1:] != sorted_zones[:-1]])
+        ends = np.r_[starts[1:], sorted_zones.size]
+        for s, e in zip(starts, ends):
+            idx = order[s:e]
+            t = get_transformer_for_zone(int(sorted_zones[s]))
+            x, y = t.transform(lons[idx], lats[idx])
+            eastings[idx] = x
+            northings[idx] = y
+    return eastings.reshape(shape), northings.reshape(shape), zones.reshape(shape)
+
+def area_from_coords(A, B, C):
+    area2 = abs(A[0]*(B[1]-C[1]) + B[0]*(C[1]-A[1]) + C[0]*(A[1]-B[1]))
+    return area2/2.0
+
+def is_triangle(A, B, C, tol=1e-6):
+    return area_from_coords(A, B, C) > tol
+
+def dist(a, b):
+    return math.hypot(a[0]-b[0], a[1]-b[1])
+
+def triangle_perimeter(A, B, C):
+    return dist(A, B) + dist(B, C) + dist(C, A)
+
+def _angle_from_sides(opposite, s1, s2):
+    denom = 2*s1*s2
+    if denom == 0:
+        return 0.0
+    cosv = (s1*s1 + s2*s2 - opposite*opposite) / denom
+    cosv = max(-1.0, min(1.0, cosv))
+    return math.degrees(math.acos(cosv))
+
+def _angles_from_sides(a, b, c):
+    # a opposite A, b opposite B, c opposite C
+    return (_angle_from_sides(a, b, c), _angle_from_sides(b, c, a), _angle_from_sides(c, a, b))
+
+def _type_from_sides(a, b, c, tol=1e-6):
+    eq_ab = abs(a-b) <= tol
+    eq_bc = abs(b-c) <= tol
+    eq_ca = abs(c-a) <= tol
+    if eq_ab and eq_bc:
+        return "Equilateral"
+    if eq_ab or eq_bc or eq_ca:
+        return "Isosceles"
+    return "Scalene"
+
+def triangle_angles(A, B, C):
+    return _angles_from_sides(dist(B, C), dist(C, A), dist(A, B))
+
+def triangle_type_by_sides(A, B, C, tol=1e-6):
+    return _type_from_sides(dist(B, C), dist(C, A), dist(A, B), tol)
+
+def is_right_triangle(angles, tol_deg=1e-1):
+    return any(abs(a-90.0) <= tol_deg for a in angles)
+
+
+class TriangleMetrics:
+    # Everything shown for one triangle; built by triangle_metrics()
+    __slots__ = ("ab", "bc", "ca", "perimeter", "area", "angles", "type", "right")
+
+    def __init__(self, ab, bc, ca, perimeter, area, angles, type, right):
+        self.ab = ab
+        self.bc = bc
+        self.ca = ca
+        self.perimeter = perimeter
+        self.area = area
+        self.angles = angles
+        self.type = type
+        self.right = right
+
+    @property
+    def sides(self):
+        return (self.ab, self.bc, self.ca)
+
+    @property
+    def min_edge(self):
+        return min(self.ab, self.bc, self.ca)
+
+    @property
+    def max_edge(self):
+        return max(self.ab, self.bc, self.ca)
+
+    def is_triangle(self, tol=1e-6):
+        return self.area > tol
+
+    def __repr__(self):
+        return (f"TriangleMetrics(perimeter={self.perimeter!r}, area={self.area!r}, "
+                f"sides={self.sides!r}, angles={self.angles!r}, type={self.type!r}, right={self.right!r})")
+
+def triangle_metrics(A, B, C, tol=1e-6, tol_deg=1e-1):
+    # one pass: the three sides are measured once and every other value is
+    # derived from them; same results as the separate functions above
+    ax, ay = A[0], A[1]
+    bx, by = B[0], B[1]
+    cx, cy = C[0], C[1]
+    ab = math.hypot(ax-bx, ay-by)
+    bc = math.hypot(bx-cx, by-cy)
+    ca = math.hypot(cx-ax, cy-ay)
+    area = abs(ax*(by-cy) + bx*(cy-ay) + cx*(ay-by))/2.0
+    angles = _angles_from_sides(bc, ca, ab)
+    right = (abs(angles[0]-90.0) <= tol_deg or abs(angles[1]-90.0) <= tol_deg or
+             abs(angles[2]-90.0) <= tol_deg)
+    return TriangleMetrics(ab, bc, ca, ab + bc + ca, area, angles, _type_from_sides(bc, ca, ab, tol), right)
+
+
+# Batch (vectorized) metrics
+# tris is an (N,3,2) array of A, B, C points; results are columns of length N
+TYPE_NAMES = ("Scalene", "Isosceles", "Equilateral")  # index == type code
+
+def batch_side_lengths(tris):
+    import numpy as np
+    tris = np.asarray(tris, dtype=float)
+    A, B, C = tris[:, 0], tris[:, 1], tris[:, 2]
+    ab = np.hypot(A[:, 0]-B[:, 0], A[:, 1]-B[:, 1])
+    bc = np.hypot(B[:, 0]-C[:, 0], B[:, 1]-C[:, 1])
+    ca = np.hypot(C[:, 0]-A[:, 0], C[:, 1]-A[:, 1])
+    return ab, bc, ca
+
+def batch_area(tris):
+    import numpy as np
+    tris = np.asarray(tris, dtype=float)
+    A, B, C = tris[:, 0], tris[:, 1], tris[:, 2]
+    area2 = np.abs(A[:, 0]*(B[:, 1]-C[:, 1]) + B[:, 0]*(C[:, 1]-A[:, 1]) + C[:, 0]*(A[:, 1]-B[:, 1]))
+    return area2/2.0
+
+def _batch_angle_from_sides(opposite, s1, s2):
+    import numpy as np
+    denom = 2*s1*s2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosv = (s1*s1 + s2*s2 - opposite*opposite) / denom
+    cosv = np.clip(cosv, -1.0, 1.0)
+    return np.where(denom == 0, 0.0, np.degrees(np.arccos(cosv)))
+
+def _batch_type_and_right(a, b, c, angles, tol, tol_deg):
+    # type codes (see TYPE_NAMES) from the sides, right flags from the angles
+    import numpy as np
+    eq_ab = np.abs(a-b) <= tol
+    eq_bc = np.abs(b-c) <= tol
+    eq_ca = np.abs(c-a) <= tol
+    type_code = np.where(eq_ab & eq_bc, 2, np.where(eq_ab | eq_bc | eq_ca, 1, 0)).astype(np.int8)
+    angle_a, angle_b, angle_c = angles
+    right = ((np.abs(angle_a-90.0) <= tol_deg) |
+             (np.abs(angle_b-90.0) <= tol_deg) |
+             (np.abs(angle_c-90.0) <= tol_deg))
+    return type_code, right
+
+def batch_triangle_metrics(tris, tol=1e-6, tol_deg=1e-1):
+    import numpy as np
+    tris = np.asarray(tris, dtype=float)
+    if tris.ndim != 3 or tris.shape[1:] != (3, 2):
+        raise ValueError(f"expected an (N,3,2) coordinate array, got shape {tris.shape}")
+    ab, bc, ca = batch_side_lengths(tris)
+    # same naming as triangle_angles: a opposite A, b opposite B, c opposite C
+    a, b, c = bc, ca, ab
+    angle_a = _batch_angle_from_sides(a, b, c)
+    angle_b = _batch_angle_from_sides(b, c, a)
+    angle_c = _batch_angle_from_sides(c, a, b)
+    type_code, right = _batch_type_and_right(a, b, c, (angle_a, angle_b, angle_c), tol, tol_deg)
+
+    return {
+        "area": batch_area(tris),
+        "perimeter": ab + bc + ca,
+        "ab": ab,
+        "bc": bc,
+        "ca": ca,
+        "angle_a": angle_a,
+        "angle_b": angle_b,
+        "angle_c": angle_c,
+        "type_code": type_code,
+        "right": right,
+    }
+
+
+# Geodesic (ellipsoidal) metrics
+# Works on lat/lon directly, so no projection and no UTM zones: sides and
+# angles come from WGS84 geodesics (Geod.inv on whole arrays), the area is
+# l'Huilier's spherical excess from those sides on the locally osculating
+# sphere. Against Geod.polygon_area_perimeter that is within about 1e-6
+# relative (plus ~1e-4 m^2 on metre-sized slivers) up to ~10 degree
+# triangles and ~1e-3 at continent scale; exact_area=True asks Geod for
+# every triangle instead.
+# latlon is an (N,3,2) array of (lat, lon) for A, B, C.
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+_E = math.sqrt(WGS84_F * (2 - WGS84_F))  # first eccentricity
+_GEOD = None
+
+def wgs84_geod():
+    global _GEOD
+    if _GEOD is None:
+        from pyproj import Geod
+        _GEOD = Geod(ellps="WGS84")
+    return _GEOD
+
+def _gaussian_radius(sin_lat):
+    # sqrt(M*N): radius of the sphere that osculates the ellipsoid at a latitude
+    return WGS84_A * math.sqrt(1 - _E*_E) / (1 - (_E*sin_lat)**2)
+
+def _lhuilier_excess(a, b, c, sqrt=math.sqrt, tan=math.tan, atan=math.atan):
+    # spherical excess from sides in radians, a >= b >= c; the brackets are
+    # Kahan's ordering for Heron, which keeps slivers accurate
+    t = (tan((a + (b + c)) / 4) * tan((c - (a - b)) / 4) *
+         tan((c + (a - b)) / 4) * tan((a + (b - c)) / 4))
+    return 4 * atan(sqrt(t * (t > 0)))
+
+def geodesic_area(A, B, C, sides=None):
+    # A, B, C are (lat, lon). The geodesic side lengths (measured here unless
+    # given as (ab, bc, ca)) go through l'Huilier on the sphere of the
+    # ellipsoid's curvature at the triangle's mean latitude.
+    if sides is None:
+        inv = wgs84_geod().inv
+        sides = (inv(A[1], A[0], B[1], B[0])[2], inv(B[1], B[0], C[1], C[0])[2], inv(C[1], C[0], A[1], A[0])[2])
+    r = _gaussian_radius(math.sin(math.radians((A[0] + B[0] + C[0]) / 3)))
+    a, b, c = sorted(sides, reverse=True)
+    return _lhuilier_excess(a / r, b / r, c / r) * r * r
+
+def batch_geodesic_area(latlon, sides=None):
+    # geodesic_area for an (N,3,2) array; sides is (ab, bc, ca) arrays
+    import numpy as np
+    latlon = np.asarray(latlon, dtype=float)
+    if sides is None:
+        start = latlon.reshape(-1, 2)
+        end = latlon[:, [1, 2, 0]].reshape(-1, 2)
+        d = np.asarray(wgs84_geod().inv(start[:, 1], start[:, 0], end[:, 1], end[:, 0])[2]).reshape(-1, 3)
+        sides = (d[:, 0], d[:, 1], d[:, 2])
+    r = _gaussian_radius(np.sin(np.radians(latlon[..., 0].mean(axis=1))))
+    d = -np.sort(-np.stack(sides, axis=1), axis=1) / r[:, None]
+    return _lhuilier_excess(d[:, 0], d[:, 1], d[:, 2], np.sqrt, np.tan, np.arctan) * r * r
+
+def _angle_between(az1, az2):
+    d = abs(az1 - az2) % 360.0
+    return min(d, 360.0 - d)
+
+def _batch_angle_between(az1, az2):
+    import numpy as np
+    d = np.abs(az1 - az2) % 360.0
+    return np.minimum(d, 360.0 - d)
+
+def point_in_range(lat, lon):
+    # False for NaN / inf as well, since those fail both comparisons
+    return abs(lat) <= 90.0 and abs(lon) <= 180.0
+
+def latlon_in_range(latlon):
+    # (N,3,2) lat/lon -> True where all six values are finite and in range
+    import numpy as np
+    latlon = np.asarray(latlon, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return (np.isfinite(latlon).all(axis=(1, 2)) &
+                (np.abs(latlon[..., 0]) <= 90.0).all(axis=1) & (np.abs(latlon[..., 1]) <= 180.0).all(axis=1))
+
+def geodesic_metrics(A, B, C, tol=1e-6, tol_deg=1e-1):
+    # A, B, C are (lat, lon); TriangleMetrics in metres, m^2 and degrees
+    inv = wgs84_geod().inv
+    az_ab, az_ba, ab = inv(A[1], A[0], B[1], B[0])
+    az_bc, az_cb, bc = inv(B[1], B[0], C[1], C[0])
+    az_ca, az_ac, ca = inv(C[1], C[0], A[1], A[0])
+    # interior angle at a vertex is between the azimuths of its two edges
+    angles = (0.0 if ab == 0 or ca == 0 else _angle_between(az_ab, az_ac),
+              0.0 if ab == 0 or bc == 0 else _angle_between(az_bc, az_ba),
+              0.0 if bc == 0 or ca == 0 else _angle_between(az_ca, az_cb))
+    right = (abs(angles[0]-90.0) <= tol_deg or abs(angles[1]-90.0) <= tol_deg or
+             abs(angles[2]-90.0) <= tol_deg)
+    return TriangleMetrics(ab, bc, ca, ab + bc + ca, geodesic_area(A, B, C, (ab, bc, ca)), angles,
+                           _type_from_sides(bc, ca, ab, tol), right)
+
+def batch_geodesic_metrics(latlon, tol=1e-6, tol_deg=1e-1, exact_area=False):
+    # same keys as batch_triangle_metrics, in metres / m^2 / degrees; one
+    # Geod.inv call for all 3N sides
+    import numpy as np
+    latlon = np.asarray(latlon, dtype=float)
+    if latlon.ndim != 3 or latlon.shape[1:] != (3, 2):
+        raise ValueError(f"expected an (N,3,2) lat/lon array, got shape {latlon.shape}")
+    n = len(latlon)
+    start = latlon[:, [0, 1, 2]].reshape(-1, 2)  # A, B, C
+    end = latlon[:, [1, 2, 0]].reshape(-1, 2)    # B, C, A
+    fwd, back, d = wgs84_geod().inv(start[:, 1], start[:, 0], end[:, 1], end[:, 0])
+    fwd = np.asarray(fwd).reshape(n, 3)
+    back = np.asarray(back).reshape(n, 3)
+    d = np.asarray(d).reshape(n, 3)
+    ab, bc, ca = d[:, 0], d[:, 1], d[:, 2]
+    angle_a = np.where((ab == 0) | (ca == 0), 0.0, _batch_angle_between(fwd[:, 0], back[:, 2]))
+    angle_b = np.where((ab == 0) | (bc == 0), 0.0, _batch_angle_between(fwd[:, 1], back[:, 0]))
+    angle_c = np.where((bc == 0) | (ca == 0), 0.0, _batch_angle_between(fwd[:, 2], back[:, 1]))
+
+    type_code, right = _batch_type_and_right(bc, ca, ab, (angle_a, angle_b, angle_c), tol, tol_deg)
+
+    if exact_area:
+        geod = wgs84_geod()
+        area = np.array([abs(geod.polygon_area_perimeter(t[:, 1], t[:, 0])[0]) for t in latlon])
+    else:
+        area = batch_geodesic_area(latlon, (ab, bc, ca))
+
+    return {
+        "area": area,
+        "perimeter": ab + bc + ca,
+        "ab": ab,
+        "bc": bc,
+        "ca": ca,
+        "angle_a": angle_a,
+        "angle_b": angle_b,
+        "angle_c": angle_c,
+        "type_code": type_code,
+        "right": right,
+    }
+
+
+# Spatial index
+# Uniform grid over projected (N,3,2) triangles, stored CSR style: the
+# triangles touching cell c are items[offsets[c]:offsets[c+1]]. A triangle is
+# only filed under cells it really overlaps (separating axis test), so a
+# point lookup is one cell slice plus a few orientation tests.
+def _cross_sign(ax, ay, bx, by, px, py):
+    return (bx-ax)*(py-ay) - (by-ay)*(px-ax)
+
+def points_in_triangles(tris, points, tol=1e-6):
+    # tris (K,3,2), points (K,2) -> bool (K,); edges and corners count as
+    # inside. Triangles with area <= tol (is_triangle's test) contain nothing:
+    # all three signs would be 0 and every point would pass.
+    A, B, C = tris[:, 0], tris[:, 1], tris[:, 2]
+    px, py = points[:, 0], points[:, 1]
+    d1 = _cross_sign(A[:, 0], A[:, 1], B[:, 0], B[:, 1], px, py)
+    d2 = _cross_sign(B[:, 0], B[:, 1], C[:, 0], C[:, 1], px, py)
+    d3 = _cross_sign(C[:, 0], C[:, 1], A[:, 0], A[:, 1], px, py)
+    area2 = _cross_sign(A[:, 0], A[:, 1], B[:, 0], B[:, 1], C[:, 0], C[:, 1])
+    has_neg = (d1 < 0) | (d2 < 0) | (d3 < 0)
+    has_pos = (d1 > 0) | (d2 > 0) | (d3 > 0)
+    return ~(has_neg & has_pos) & (abs(area2) > 2*tol)
+
+def triangles_intersect_boxes(tris, boxes):
+    # tris (K,3,2), boxes (K,4) as xmin, ymin, xmax, ymax -> bool (K,).
+    # Separating axis test: the box axes, then the three edge normals.
+    import numpy as np
+    xs, ys = tris[..., 0], tris[..., 1]
+    hit = ((xs.min(axis=1) <= boxes[:, 2]) & (xs.max(axis=1) >= boxes[:, 0]) &
+           (ys.min(axis=1) <= boxes[:, 3]) & (ys.max(axis=1) >= boxes[:, 1]))
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    hx = (boxes[:, 2] - boxes[:, 0]) / 2
+    hy = (boxes[:, 3] - boxes[:, 1]) / 2
+    for i in range(3):
+        j = (i + 1) % 3
+        nx = -(ys[:, j] - ys[:, i])
+        ny = xs[:, j] - xs[:, i]
+        proj = xs * nx[:, None] + ys * ny[:, None]
+        centre = cx*nx + cy*ny
+        radius = np.abs(nx)*hx + np.abs(ny)*hy
+        hit &= (proj.min(axis=1) <= centre + radius) & (proj.max(axis=1) >= centre - radius)
+    return hit
+
+class TriangleGridIndex:
+    MAX_CELLS_PER_TRIANGLE = 2  # grid never has more cells than this * N
+    SMALL_CELL = 16  # query_point tests up to this many candidates without numpy
+    TOL = 1e-6  # triangles with area <= TOL (m^2) are not indexed, as in is_triangle
+
+    def __init__(self, tris, ids=None, cell_size=None, zone=None, _arrays=None):
+        import numpy as np
+        self.tris = np.ascontiguousarray(tris, dtype=float)
+        if self.tris.ndim != 3 or self.tris.shape[1:] != (3, 2):
+            raise ValueError(f"expected an (N,3,2) coordinate array, got shape {self.tris.shape}")
+        self.ids = None if ids is None else np.asarray(ids)
+        self.zone = zone
+        if _arrays is not None:  # load()
+            self.x0, self.y0, self.cell, self.nx, self.ny, self.offsets, self.items = _arrays
+            return
+        self._build(cell_size)
+
+    def __len__(self):
+        return len(self.tris)
+
+    def _build(self, cell_size):
+        import numpy as np
+        tris, n = self.tris, len(self.tris)
+        lo = tris.min(axis=1)
+        hi = tris.max(axis=1)
+        if n:
+            self.x0, self.y0 = (float(v) for v in lo.min(axis=0))
+            width, height = (float(v) for v in hi.max(axis=0) - lo.min(axis=0))
+        else:
+            self.x0 = self.y0 = 0.0
+            width = height = 0.0
+        if cell_size is None:
+            # about one cell per typical triangle, but never more than
+            # MAX_CELLS_PER_TRIANGLE * N cells in total
+            typical = float(np.median((hi - lo).max(axis=1))) if n else 1.0
+            cell_size = max(typical, math.sqrt(width * height / (self.MAX_CELLS_PER_TRIANGLE * max(n, 1))))
+        self.cell = float(cell_size) if cell_size > 0 else 1.0
+        self.nx = int(width // self.cell) + 1
+        self.ny = int(height // self.cell) + 1
+
+        ix0, iy0 = self._cell_of(lo[:, 0], lo[:, 1])
+        ix1, iy1 = self._cell_of(hi[:, 0], hi[:, 1])
+        w = ix1 - ix0 + 1
+        counts = w * (iy1 - iy0 + 1)
+        # degenerate triangles (area <= TOL) can contain nothing; leave them out
+        area2 = np.abs((tris[:, 1, 0]-tris[:, 0, 0])*(tris[:, 2, 1]-tris[:, 0, 1]) -
+                       (tris[:, 1, 1]-tris[:, 0, 1])*(tris[:, 2, 0]-tris[:, 0, 0]))
+        counts[area2 <= 2*self.TOL] = 0
+        # every (triangle, cell) pair of each bbox in one flat array
+        tri = np.repeat(np.arange(n, dtype=np.int64), counts)
+        local = np.arange(counts.sum(), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = ix0[tri] + local % w[tri]
+        cy = iy0[tri] + local // w[tri]
+        boxes = np.stack([self.x0 + cx*self.cell, self.y0 + cy*self.cell,
+                          self.x0 + (cx+1)*self.cell, self.y0 + (cy+1)*self.cell], axis=1)
+        keep = triangles_intersect_boxes(tris[tri], boxes)
+        cells = (cy * self.nx + cx)[keep]
+        tri = tri[keep]
+        order = np.argsort(cells, kind="stable")  # keeps triangle order inside a cell
+        self.items = tri[order]
+        self.offsets = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.nx * self.ny), out=self.offsets[1:])
+
+    def _cell_of(self, x, y):
+        import numpy as np
+        ix = np.clip(((np.asarray(x) - self.x0) // self.cell).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(((np.asarray(y) - self.y0) // self.cell).astype(np.int64), 0, self.ny - 1)
+        return ix, iy
+
+    def _outside(self, x, y):
+        # bitwise ops so this works for scalars and arrays alike
+        return ((x < self.x0) | (y < self.y0) |
+                (x > self.x0 + self.nx*self.cell) | (y > self.y0 + self.ny*self.cell))
+
+    def query_point(self, x, y):
+        # indices of every triangle containing (x, y), ascending
+        import numpy as np
+        x, y = float(x), float(y)
+        if self._outside(x, y):
+            return np.empty(0, dtype=np.int64)
+        ix = min(int((x - self.x0) // self.cell), self.nx - 1)
+        iy = min(int((y - self.y0) // self.cell), self.ny - 1)
+        c = iy * self.nx + ix
+        cand = self.items[self.offsets[c]:self.offsets[c+1]]
+        if len(cand) > self.SMALL_CELL:
+            inside = points_in_triangles(self.tris[cand], np.broadcast_to([x, y], (len(cand), 2)), self.TOL)
+            return cand[inside]
+        # a handful of candidates is quicker in plain Python than in numpy
+        hits = []
+        for i, ((ax, ay), (bx, by), (cx, cy)) in zip(cand.tolist(), self.tris[cand].tolist()):
+            d1 = _cross_sign(ax, ay, bx, by, x, y)
+            d2 = _cross_sign(bx, by, cx, cy, x, y)
+            d3 = _cross_sign(cx, cy, ax, ay, x, y)
+            if (not ((d1 < 0 or d2 < 0 or d3 < 0) and (d1 > 0 or d2 > 0 or d3 > 0)) and
+                    abs(_cross_sign(ax, ay, bx, by, cx, cy)) > 2*self.TOL):
+                hits.append(i)
+        return np.array(hits, dtype=np.int64)
+
+    def locate(self, points):
+        # (M,2) points -> (M,) index of the first triangle containing each
+        # point, -1 where none does; every candidate is tested in one pass
+        import numpy as np
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        result = np.full(len(points), -1, dtype=np.int64)
+        ix, iy = self._cell_of(points[:, 0], points[:, 1])
+        c = iy * self.nx + ix
+        start = self.offsets[c]
+        counts = self.offsets[c + 1] - start
+        counts[self._outside(points[:, 0], points[:, 1])] = 0
+        pt = np.repeat(np.arange(len(points), dtype=np.int64), counts)
+        if not len(pt):
+            return result
+        cand = self.items[np.repeat(start, counts) +
+                          np.arange(len(pt), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)]
+        inside = points_in_triangles(self.tris[cand], points[pt], self.TOL)
+        # candidates run in ascending triangle order per point, so the
+        # reversed assignment leaves the first hit in place
+        hit_pt, hit_tri = pt[inside], cand[inside]
+        result[hit_pt[::-1]] = hit_tri[::-1]
+        return result
+
+    def query_bbox(self, xmin, ymin, xmax, ymax):
+        # indices of every triangle intersecting the box, ascending
+        import numpy as np
+        if xmin > xmax or ymin > ymax:
+            raise ValueError("box min must not exceed max")
+        if (xmax < self.x0 or ymax < self.y0 or
+                xmin > self.x0 + self.nx*self.cell or ymin > self.y0 + self.ny*self.cell):
+            return np.empty(0, dtype=np.int64)
+        ix0, iy0 = self._cell_of(xmin, ymin)
+        ix1, iy1 = self._cell_of(xmax, ymax)
+        rows = [self.items[self.offsets[y*self.nx + ix0]:self.offsets[y*self.nx + ix1 + 1]]
+                for y in range(int(iy0), int(iy1) + 1)]
+        cand = np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+        if not len(cand):
+            return cand
+        box = np.broadcast_to([float(xmin), float(ymin), float(xmax), float(ymax)], (len(cand), 4))
+        return cand[triangles_intersect_boxes(self.tris[cand], box)]
+
+    def id_of(self, indices):
+        if self.ids is None:
+            return [int(i) for i in indices]
+        return self.ids[indices].tolist()
+
+    def save(self, path):
+        import numpy as np
+        with open(path, "wb") as f:  # a file object stops savez adding ".npz"
+            np.savez(f, tris=self.tris, ids=self.ids if self.ids is not None else np.empty(0),
+                     has_ids=self.ids is not None, zone=-1 if self.zone is None else self.zone,
+                     grid=np.array([self.x0, self.y0, self.cell, self.nx, self.ny], dtype=float),
+                     offsets=self.offsets, items=self.items)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        with np.load(path, allow_pickle=False) as data:
+            x0, y0, cell, nx, ny = data["grid"].tolist()
+            zone = int(data["zone"])
+            return cls(data["tris"], data["ids"] if bool(data["has_ids"]) else None,
+                       zone=None if zone < 0 else zone,
+                       _arrays=(x0, y0, cell, int(nx), int(ny), data["offsets"], data["items"]))
@@ -0,0 +1,75 @@
+# bench_endpoints.py
+# In-process comparison of the SOAP, JSON and binary paths of soap.py: the
+# same triangles go through route_request (parse + compute + serialize, no
+# network), with caches off so every request is computed.
+import argparse
+import json
+import time
+
+import numpy as np
+
+import soap
+
+SOAP_ENVELOPE = ('<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+                 'xmlns:tri="http://example.org/triangle"><soap:Body>%s</soap:Body></soap:Envelope>')
+
+def soap_single(row, unit):
+    args = ''.join('<tri:%s>%r</tri:%s>' % (k, v, k) for k, v in zip(soap.TRIANGLE_KEYS, row.tolist()))
+    return (SOAP_ENVELOPE % ('<tri:Perimeter>%s<tri:unit>%s</tri:unit></tri:Perimeter>' % (args, unit))).encode('utf-8')
+
+def soap_batch(rows, unit):
+    tris = ''.join('<tri:triangle>%s</tri:triangle>'
+                   % ''.join('<tri:%s>%r</tri:%s>' % (k, v, k) for k, v in zip(soap.TRIANGLE_KEYS, row.tolist()))
+                   for row in rows)
+    return (SOAP_ENVELOPE % ('<tri:PerimeterBatch><tri:triangles>%s</tri:triangles><tri:unit>%s</tri:unit></tri:PerimeterBatch>'
+                             % (tris, unit))).encode('utf-8')
+
+def run(label, requests, headers, path, triangles_per_request, seconds):
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        for body in requests:
+            status, response = soap.route_request('POST', path, headers, body)[:2]
+            assert status == 200 and b'Fault' not in response[:512], (label, status, response[:200])
+            n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds:
+            break
+    return label, n / elapsed, n * triangles_per_request / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process throughput of the SOAP, JSON and binary endpoints of soap.py.")
+    parser.add_argument("--batch", type=int, default=1000, help="triangles per batch request (default: 1000)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time per case (default: 2)")
+    parser.add_argument("--unit", default="meters",
+                        help="meters/km (geodesic, default) or degrees (legacy planar)")
+    args = parser.parse_args()
+
+    soap.dispatcher.trace = False
+    soap.RESULT_CACHE.configure(0, 0)
+    soap.RESPONSE_CACHE.configure(0, 0)
+
+    rng = np.random.default_rng(0)
+    rows = rng.uniform(-80, 80, (max(args.batch, 64), 6))
+    xml = {'Content-Type': 'text/xml; charset=utf-8'}
+    js = {'Content-Type': 'application/json'}
+    binary = {'Content-Type': 'application/octet-stream'}
+    batch = rows[:args.batch]
+    unit = args.unit
+    cases = [
+        run('SOAP Perimeter (fast path)', [soap_single(r, unit) for r in rows[:64]], xml, '/', 1, args.seconds),
+        run('JSON perimeter', [json.dumps(dict(zip(soap.TRIANGLE_KEYS, r.tolist()), unit=unit)).encode('utf-8')
+                               for r in rows[:64]], js, '/json', 1, args.seconds),
+        run('SOAP PerimeterBatch', [soap_batch(batch, unit)], xml, '/', len(batch), args.seconds),
+        run('JSON batch', [json.dumps({'triangles': batch.tolist(), 'unit': unit}).encode('utf-8')], js, '/json',
+            len(batch), args.seconds),
+        run('binary batch', [batch.astype('<f8').tobytes()], binary, '/bin?unit=%s' % unit, len(batch), args.seconds),
+    ]
+    base_single, base_batch = cases[0][2], cases[2][2]
+    print("%-28s %12s %14s %9s" % ("path", "requests/s", "triangles/s", "vs SOAP"))
+    for i, (label, rps, tps) in enumerate(cases):
+        base = base_single if i < 2 else base_batch
+        print("%-28s %12.0f %14.0f %8.1fx" % (label, rps, tps, tps / base))
+
+if __name__ == '__main__':
+    main()
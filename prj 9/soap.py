@@ -1,42 +1,229 @@
 # soap.py
-from pysimplesoap.server import SoapDispatcher, SOAPHandler
+from pysimplesoap.server import SoapDispatcher, SOAPHandler, SoapFault
+from pysimplesoap.helpers import float_m
 from http.server import HTTPServer
-import math
+import numpy as np
+import argparse
+import asyncio
+import bisect
+import gzip
+import hashlib
+import http
+import http.client
+import io
+import json
+import logging
+import os
+import queue
+import re
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import urlparse, parse_qs
+
+# geometry is shared with the GUI; mosalas_core lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mosalas_core import (TRANSFORMER_POOL, TriangleGridIndex, batch_area, batch_geodesic_metrics,
+                          batch_side_lengths, geodesic_metrics, get_transformer_for_zone, latlon_in_range,
+                          point_in_range, triangle_metrics)
+
+trace_log = logging.getLogger('TriangleService.trace')
 
 # ---------------- Dispatcher ----------------
-dispatcher = SoapDispatcher(
+class TriangleDispatcher(SoapDispatcher):
+    # The WSDL is rendered once and kept as bytes (plus a gzipped copy and an
+    # ETag for each); registering a function or moving the service rebuilds it.
+    def __init__(self, *args, **kwargs):
+        self._wsdl_lock = threading.Lock()
+        self._wsdl_entry = None
+        # trace=True dumps every request/response envelope (development only)
+        self.trace = kwargs.pop('trace', False)
+        SoapDispatcher.__init__(self, *args, **kwargs)
+
+    def dispatch(self, xml, action=None, fault=None):
+        # exact-repeat envelopes are answered straight from cached bytes
+        cacheable = action is None and RESPONSE_CACHE.enabled and len(xml) <= MAX_CACHED_ENVELOPE
+        response = RESPONSE_CACHE.get(xml) if cacheable else None
+        if response is not None:
+            cacheable = False  # a hit must not refresh the entry's expiry
+        if response is None and action is None:
+            for fast in FAST_OPERATIONS.values():
+                response = fast.dispatch(xml)
+                if response is not None:
+                    break
+        if response is None:
+            call_fault = {}
+            response = SoapDispatcher.dispatch(self, xml, action, call_fault)
+            if call_fault:
+                cacheable = False
+                if fault is not None:
+                    fault.update(call_fault)
+        if cacheable:
+            RESPONSE_CACHE.put(xml, response)
+        if self.trace:
+            trace_log.info("request:\n%s\nresponse:\n%s", xml, response.decode('utf-8', 'replace'))
+        return response
+
+    def register_function(self, *args, **kwargs):
+        SoapDispatcher.register_function(self, *args, **kwargs)
+        self.invalidate_wsdl()
+
+    def set_location(self, url):
+        self.location = self.action = url
+        self.invalidate_wsdl()
+
+    def invalidate_wsdl(self):
+        with self._wsdl_lock:
+            self._wsdl_entry = None
+
+    def wsdl_entry(self):
+        entry = self._wsdl_entry
+        if entry is None:
+            with self._wsdl_lock:
+                entry = self._wsdl_entry
+                if entry is None:
+                    body = SoapDispatcher.wsdl(self)
+                    digest = hashlib.sha1(body).hexdigest()
+                    entry = self._wsdl_entry = (body, gzip.compress(body, 9, mtime=0),
+                                                '"%s"' % digest, '"%s-gzip"' % digest)
+        return entry
+
+    def wsdl(self):
+        return self.wsdl_entry()[0]
+
+
+dispatcher = TriangleDispatcher(
     name='TriangleService',
     location='http://127.0.0.1:8000/',
     action='http://127.0.0.1:8000/',
     namespace='http://example.org/triangle',
-    trace=True,
     ns=True
 )
 
+# ---------------- Caches ----------------
+MAX_CACHED_ENVELOPE = 4096  # bytes; bigger (batch) envelopes are never cached
+
+class ResultCache:
+    # Thread-safe LRU with an optional time-to-live. maxsize=0 disables it.
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.configure(maxsize, ttl)
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def configure(self, maxsize, ttl):
+        with self.lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            while len(self.entries) > max(maxsize, 0):
+                self.entries.popitem(last=False)
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None:
+                if item[0] is None or item[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions, 'expirations': self.expirations}
+
+RESULT_CACHE = ResultCache()
+RESPONSE_CACHE = ResultCache()
+CACHE_PRECISION = [9]  # decimal places coordinates are rounded to for RESULT_CACHE keys
+
+def quantize(value):
+    if isinstance(value, float):
+        return round(value, CACHE_PRECISION[0])
+    return value
+
+def memoized(name, fn):
+    # Results are keyed on the operation and its arguments, with coordinates
+    # rounded to CACHE_PRECISION so re-submitted parcels hit the cache.
+    def wrapper(**kwargs):
+        if not RESULT_CACHE.enabled:
+            return fn(**kwargs)
+        key = (name,) + tuple(sorted((k, quantize(v)) for k, v in kwargs.items()))
+        missing = RESULT_CACHE
+        result = RESULT_CACHE.get(key, missing)
+        if result is missing:
+            result = fn(**kwargs)
+            RESULT_CACHE.put(key, result)
+        return result
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
 # ---------------- Functions ----------------
+# unit picks the engine as well as the scale: 'degrees' is the original
+# Euclidean distance in raw lat/lon degrees, metres and kilometres are
+# geodesic lengths on the WGS84 ellipsoid (areas in the unit squared).
+UNIT_SCALES = {
+    'degrees': None,
+    'meters': 1.0, 'metres': 1.0, 'm': 1.0,
+    'kilometers': 1000.0, 'kilometres': 1000.0, 'km': 1000.0,
+}
+
+def unit_scale(unit):
+    try:
+        return UNIT_SCALES[str(unit).strip().lower()]
+    except KeyError:
+        raise SoapFault('UnknownUnit', 'unknown unit %r (expected degrees, meters or km)' % (unit,))
+
+COORDINATE_RANGE = 'latitudes must be within [-90, 90] and longitudes within [-180, 180]'
+
 def Perimeter(lat1, lon1, lat2, lon2, lat3, lon3, unit='meters'):
     # تبدیل ورودی‌ها به float
     lat1, lon1 = float(lat1), float(lon1)
     lat2, lon2 = float(lat2), float(lon2)
     lat3, lon3 = float(lat3), float(lon3)
-    
-    # محاسبه فاصله دو نقطه (Euclidean approximation)
-    def distance(x1, y1, x2, y2):
-        return math.sqrt((x2-x1)**2 + (y2-y1)**2)
-
-    d12 = distance(lat1, lon1, lat2, lon2)
-    d23 = distance(lat2, lon2, lat3, lon3)
-    d31 = distance(lat3, lon3, lat1, lon1)
-    
-    perimeter = d12 + d23 + d31
+    scale = unit_scale(unit)
 
-    # اگر خواستیم تبدیل واحد کنیم می‌تونیم بعداً اضافه کنیم
-    return perimeter
+    if scale is None:
+        # محاسبه محیط (Euclidean approximation in degrees)
+        return triangle_metrics((lat1, lon1), (lat2, lon2), (lat3, lon3)).perimeter
+    if not (point_in_range(lat1, lon1) and point_in_range(lat2, lon2) and point_in_range(lat3, lon3)):
+        raise SoapFault('BadCoordinate', COORDINATE_RANGE)
+    return geodesic_metrics((lat1, lon1), (lat2, lon2), (lat3, lon3)).perimeter / scale
 
 # ثبت تابع در Dispatcher
 dispatcher.register_function(
     name='Perimeter',
-    fn=Perimeter,
+    fn=memoized('Perimeter', Perimeter),
     returns={'Perimeter': float},
     args={
         'lat1': float, 'lon1': float,
@@ -46,35 +233,1012 @@ dispatcher.register_function(
     }
 )
 
+# ---------------- Fast Path ----------------
+SOAP_ENV_URI = 'http://schemas.xmlsoap.org/soap/envelope/'
+NUMBER_RX = r'([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)'
+MAX_FAST_TEMPLATES = 64
+
+class FastOperation:
+    # Recognises the fixed envelope clients send for one operation (prefixed
+    # SOAP and target namespaces, arguments in declared order, plain numbers)
+    # with one pre-compiled regex and answers from a response template that
+    # the generic dispatcher rendered once, so the bytes are identical.
+    # Anything else returns None and takes the normal pysimplesoap path.
+    def __init__(self, dispatcher, name, float_args, str_args=()):
+        self.dispatcher = dispatcher
+        self.name = name
+        fn, returns_types, args_types, doc = dispatcher.methods[name]
+        self.fn = fn
+        self.return_name = list(returns_types)[0]
+        self.float_args = tuple(float_args)
+        self.str_args = tuple(str_args)
+        args = ''.join(r'<(?P=p):%s>%s</(?P=p):%s>\s*' % (a, NUMBER_RX, a) for a in self.float_args)
+        args += ''.join(r'(?:<(?P=p):%s>([^<&]+)</(?P=p):%s>\s*)?' % (a, a) for a in self.str_args)
+        self.rx = re.compile(
+            r'\A\s*(?:<\?xml[^>]*\?>\s*)?'
+            r'<(?P<s>[\w-]+):Envelope\s+xmlns:(?P=s)="%s"\s+xmlns:(?P<p>[\w-]+)="%s"\s*>\s*'
+            r'(?:<(?P=s):Header\s*/>\s*)?<(?P=s):Body>\s*<(?P=p):%s>\s*%s'
+            r'</(?P=p):%s>\s*</(?P=s):Body>\s*</(?P=s):Envelope>\s*\Z'
+            % (re.escape(SOAP_ENV_URI), re.escape(dispatcher.namespace), name, args, name))
+        self.templates = {}  # (soap prefix, ns prefix) -> (head, tail) or None
+        self.hits = 0
+
+    def template(self, soap_prefix, ns_prefix):
+        key = (soap_prefix, ns_prefix)
+        if key in self.templates:
+            return self.templates[key]
+        # render a sample call through the generic dispatcher and cut it
+        # around the returned value
+        args = ''.join('<%s:%s>0</%s:%s>' % (ns_prefix, a, ns_prefix, a) for a in self.float_args)
+        xml = ('<%s:Envelope xmlns:%s="%s" xmlns:%s="%s"><%s:Body><%s:%s>%s</%s:%s></%s:Body></%s:Envelope>'
+               % (soap_prefix, soap_prefix, SOAP_ENV_URI, ns_prefix, self.dispatcher.namespace,
+                  soap_prefix, ns_prefix, self.name, args, ns_prefix, self.name, soap_prefix, soap_prefix))
+        fault = {}
+        response = SoapDispatcher.dispatch(self.dispatcher, xml, fault=fault)
+        open_tag = ('<%s>' % self.return_name).encode('utf-8')
+        close_tag = ('</%s>' % self.return_name).encode('utf-8')
+        start = response.find(open_tag)
+        end = response.find(close_tag)
+        entry = None
+        if not fault and start >= 0 and end > start:
+            entry = (response[:start + len(open_tag)], response[end:])
+        if len(self.templates) < MAX_FAST_TEMPLATES:
+            self.templates[key] = entry
+        return entry
+
+    def dispatch(self, xml):
+        m = self.rx.match(xml)
+        if m is None:
+            return None
+        entry = self.template(m.group('s'), m.group('p'))
+        if entry is None:
+            return None
+        groups = m.groups()[2:]
+        kwargs = dict(zip(self.float_args, [float(v) for v in groups[:len(self.float_args)]]))
+        for name, value in zip(self.str_args, groups[len(self.float_args):]):
+            if value is not None:
+                kwargs[name] = value
+        try:
+            ret = self.fn(**kwargs)
+        except Exception:
+            return None  # let the generic path build the fault
+        if type(ret) is not float:
+            return None
+        self.hits += 1
+        head, tail = entry
+        return head + float_m(ret).encode('utf-8') + tail
+
+FAST_OPERATIONS = {}
+
+def register_fast_operation(name, float_args, str_args=()):
+    FAST_OPERATIONS[name] = FastOperation(dispatcher, name, float_args, str_args)
+
+register_fast_operation('Perimeter', ('lat1', 'lon1', 'lat2', 'lon2', 'lat3', 'lon3'), ('unit',))
+
+# ---------------- Batch ----------------
+# pysimplesoap's wsdl() looks type declarations up in a dict, which fails for
+# plain (unhashable) list/dict declarations; these hashable twins behave the
+# same everywhere else.
+class ArrayOf(list):
+    __hash__ = object.__hash__
+
+class Struct(dict):
+    __hash__ = object.__hash__
+
+BATCH_METRICS = ('perimeter', 'area', 'd12', 'd23', 'd31')
+TRIANGLE_KEYS = ('lat1', 'lon1', 'lat2', 'lon2', 'lat3', 'lon3')
+TRIANGLE_ARGS = Struct({
+    'lat1': float, 'lon1': float,
+    'lat2': float, 'lon2': float,
+    'lat3': float, 'lon3': float,
+})
+
+def batch_metrics(coords, unit='meters'):
+    # coords: (N, 6) array of lat1, lon1, lat2, lon2, lat3, lon3 rows.
+    # Same engine and unit as Perimeter, for all triangles at once.
+    tris = np.asarray(coords, dtype=float).reshape(-1, 3, 2)
+    scale = unit_scale(unit)
+    if scale is None:
+        d12, d23, d31 = batch_side_lengths(tris)
+        area = batch_area(tris)
+    else:
+        bad = np.flatnonzero(~latlon_in_range(tris))
+        if len(bad):
+            raise SoapFault('BadCoordinate', '%s (triangle %s)' % (COORDINATE_RANGE, ', '.join(map(str, bad[:10]))))
+        res = batch_geodesic_metrics(tris)
+        d12, d23, d31 = res['ab'] / scale, res['bc'] / scale, res['ca'] / scale
+        area = res['area'] / (scale * scale)
+    return {'perimeter': d12 + d23 + d31, 'area': area, 'd12': d12, 'd23': d23, 'd31': d31}
+
+def PerimeterBatch(triangles=None, metrics=None, unit='meters'):
+    names = [m['metric'] for m in (metrics or [])] or ['perimeter']
+    unknown = [n for n in names if n not in BATCH_METRICS]
+    if unknown:
+        raise SoapFault('UnknownMetric', 'unknown metric(s): %s (expected %s)'
+                        % (', '.join(unknown), ', '.join(BATCH_METRICS)))
+    unit_scale(unit)  # fault on a bad unit even for an empty batch
+    rows = [[t['triangle'][k] for k in TRIANGLE_KEYS] for t in (triangles or [])]
+    if not rows:
+        return {'results': []}
+    computed = batch_metrics(rows, unit)
+    columns = [computed[n].tolist() for n in names]
+    return {'results': [{'result': dict(zip(names, values))} for values in zip(*columns)]}
+
+dispatcher.register_function(
+    name='PerimeterBatch',
+    fn=PerimeterBatch,
+    returns={'results': ArrayOf([{'result': Struct((m, float) for m in BATCH_METRICS)}])},
+    args={
+        'triangles': ArrayOf([{'triangle': TRIANGLE_ARGS}]),
+        'metrics': ArrayOf([{'metric': str}]),
+        'unit': str
+    }
+)
+
+# ---------------- Spatial index ----------------
+# Parcels indexed by `mosalas.py index` and loaded with --index. Queries are
+# lat/lon, projected into the UTM zone the index was built in; a box is the
+# bounding box of its projected corners.
+SPATIAL_INDEX = [None]
+
+def load_spatial_index(path):
+    index = TriangleGridIndex.load(path)
+    if index.zone is None:
+        raise ValueError('%s has no UTM zone; build it with mosalas.py index' % path)
+    SPATIAL_INDEX[0] = index
+    return index
+
+def warm_thread():
+    # pyproj transformers are cached per thread, so each request thread
+    # builds the index zone's one before its first request rather than during it
+    if SPATIAL_INDEX[0] is not None:
+        TRANSFORMER_POOL.prewarm([SPATIAL_INDEX[0].zone])
+
+def spatial_index():
+    if SPATIAL_INDEX[0] is None:
+        raise SoapFault('NoIndex', 'no spatial index loaded (start the service with --index FILE)')
+    return SPATIAL_INDEX[0]
+
+def id_list(index, found):
+    return {'ids': [{'id': i} for i in index.id_of(found)]}
+
+def TrianglesAtPoint(lat, lon):
+    index = spatial_index()
+    x, y = get_transformer_for_zone(index.zone).transform(float(lon), float(lat))
+    return id_list(index, index.query_point(x, y))
+
+def TrianglesInBox(min_lat, min_lon, max_lat, max_lon):
+    index = spatial_index()
+    min_lat, min_lon, max_lat, max_lon = float(min_lat), float(min_lon), float(max_lat), float(max_lon)
+    if min_lat > max_lat or min_lon > max_lon:
+        raise SoapFault('BadBox', 'min_lat/min_lon must not exceed max_lat/max_lon')
+    xs, ys = get_transformer_for_zone(index.zone).transform(
+        [min_lon, max_lon, max_lon, min_lon], [min_lat, min_lat, max_lat, max_lat])
+    return id_list(index, index.query_bbox(min(xs), min(ys), max(xs), max(ys)))
+
+IDS_RESULT = {'ids': ArrayOf([{'id': str}])}
+
+dispatcher.register_function(
+    name='TrianglesAtPoint',
+    fn=TrianglesAtPoint,
+    returns=IDS_RESULT,
+    args={'lat': float, 'lon': float}
+)
+
+dispatcher.register_function(
+    name='TrianglesInBox',
+    fn=TrianglesInBox,
+    returns=IDS_RESULT,
+    args={'min_lat': float, 'min_lon': float, 'max_lat': float, 'max_lon': float}
+)
+
+# ---------------- Metrics ----------------
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+OPERATION_RX = re.compile(r'<(?:[\w.-]+:)?Body\b[^>]*>\s*<(?:[\w.-]+:)?([\w.-]+)')
+
+def operation_name(xml):
+    m = OPERATION_RX.search(xml)
+    return m.group(1) if m and m.group(1) in dispatcher.methods else 'unknown'
+
+class Metrics:
+    # In-process counters and fixed-bucket latency histograms, rendered in the
+    # Prometheus text format. One lock, a few integer adds per request.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = {}
+        self.errors = {}
+        self.histograms = {}  # op -> [bucket counts..., +Inf count, sum]
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, op, seconds, error=False):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.in_flight -= 1
+            self.requests[op] = self.requests.get(op, 0) + 1
+            if error:
+                self.errors[op] = self.errors.get(op, 0) + 1
+            h = self.histograms.get(op)
+            if h is None:
+                h = self.histograms[op] = [0] * (len(self.buckets) + 1) + [0.0]
+            h[i] += 1
+            h[-1] += seconds
+
+    def render(self):
+        with self.lock:
+            in_flight = self.in_flight
+            requests = dict(self.requests)
+            errors = dict(self.errors)
+            histograms = dict((op, list(h)) for op, h in self.histograms.items())
+        out = [
+            '# HELP triangle_soap_in_flight Requests currently being dispatched.',
+            '# TYPE triangle_soap_in_flight gauge',
+            'triangle_soap_in_flight %d' % in_flight,
+            '# HELP triangle_soap_requests_total SOAP requests by operation.',
+            '# TYPE triangle_soap_requests_total counter',
+        ]
+        for op in sorted(requests):
+            out.append('triangle_soap_requests_total{operation="%s"} %d' % (op, requests[op]))
+        out.append('# HELP triangle_soap_errors_total SOAP requests that returned a fault.')
+        out.append('# TYPE triangle_soap_errors_total counter')
+        for op in sorted(requests):
+            out.append('triangle_soap_errors_total{operation="%s"} %d' % (op, errors.get(op, 0)))
+        out.append('# HELP triangle_soap_fast_path_total Requests answered by the fast-path parser.')
+        out.append('# TYPE triangle_soap_fast_path_total counter')
+        for op in sorted(FAST_OPERATIONS):
+            out.append('triangle_soap_fast_path_total{operation="%s"} %d' % (op, FAST_OPERATIONS[op].hits))
+        for cache_name, cache in (('result', RESULT_CACHE), ('response', RESPONSE_CACHE)):
+            st = cache.stats()
+            for field, kind, text in (('hits', 'counter', 'lookups answered from'),
+                                      ('misses', 'counter', 'lookups not found in'),
+                                      ('evictions', 'counter', 'entries evicted from'),
+                                      ('expirations', 'counter', 'entries expired in'),
+                                      ('size', 'gauge', 'entries currently in')):
+                metric = 'triangle_soap_%s_cache_%s' % (cache_name, field)
+                if kind == 'counter':
+                    metric += '_total'
+                out.append('# HELP %s %s the %s cache.' % (metric, text.capitalize(), cache_name))
+                out.append('# TYPE %s %s' % (metric, kind))
+                out.append('%s %d' % (metric, st[field]))
+        out.append('# HELP triangle_soap_request_duration_seconds Dispatch latency by operation.')
+        out.append('# TYPE triangle_soap_request_duration_seconds histogram')
+        for op in sorted(histograms):
+            h = histograms[op]
+            cumulative = 0
+            for le, count in zip(self.buckets, h):
+                cumulative += count
+                out.append('triangle_soap_request_duration_seconds_bucket{operation="%s",le="%g"} %d' % (op, le, cumulative))
+            cumulative += h[len(self.buckets)]
+            out.append('triangle_soap_request_duration_seconds_bucket{operation="%s",le="+Inf"} %d' % (op, cumulative))
+            out.append('triangle_soap_request_duration_seconds_sum{operation="%s"} %.6f' % (op, h[-1]))
+            out.append('triangle_soap_request_duration_seconds_count{operation="%s"} %d' % (op, cumulative))
+        return ('\n'.join(out) + '\n').encode('utf-8')
+
+METRICS = Metrics()
+
 # ---------------- Request Handler ----------------
-class SOAPRequestHandler(SOAPHandler):
-    def do_GET(self):
-        from urllib.parse import urlparse, parse_qs
-        parsed_path = urlparse(self.path)
-        query_params = parse_qs(parsed_path.query)
+GZIP_MIN_SIZE = 1024  # smaller responses are not worth compressing
+GZIP_LEVEL = 6
+MAX_REQUEST_BODY = 64 * 1024 * 1024
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    # weak comparison, as If-None-Match requires
+    return '*' in tags or etag in tags or ('W/' + etag) in tags
+
+def accepts_gzip(accept_encoding):
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+def encode_body(body, request_headers, compressed=False):
+    # compressed=True means body is already gzipped (pre-rendered WSDL)
+    if not compressed and len(body) >= GZIP_MIN_SIZE and accepts_gzip(request_headers.get('Accept-Encoding')):
+        return gzip.compress(body, GZIP_LEVEL), True
+    return body, compressed
+
+def inflate_body(body, content_encoding):
+    if (content_encoding or '').lower() != 'gzip':
+        return body
+    inflater = zlib.decompressobj(wbits=31)
+    body = inflater.decompress(body, MAX_REQUEST_BODY + 1)
+    if len(body) > MAX_REQUEST_BODY or inflater.unconsumed_tail:
+        raise ValueError('request body too large')
+    return body
+
+def wsdl_response(headers):
+    # the identity and gzip bodies are different representations, so each
+    # has its own strong ETag
+    body, body_gz, etag, etag_gz = dispatcher.wsdl_entry()
+    compressed = accepts_gzip(headers.get('Accept-Encoding'))
+    if compressed:
+        body, etag = body_gz, etag_gz
+    extra = [('ETag', etag), ('Vary', 'Accept-Encoding')]
+    if etag_matches(headers.get('If-None-Match'), etag):
+        return 304, b'', 'text/xml; charset=utf-8', extra, False
+    return 200, body, 'text/xml; charset=utf-8', extra, compressed
+
+def soap_call(data_bytes):
+    try:
+        data = data_bytes.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise RequestError('request body is not valid UTF-8: %s' % e)
+    op = operation_name(data)
+    fault = {}
+    failed = True
+    METRICS.begin()
+    t0 = time.perf_counter()
+    try:
+        response = dispatcher.dispatch(data, fault=fault)
+        failed = bool(fault)
+    finally:
+        METRICS.end(op, time.perf_counter() - t0, failed)
+    return response
+
+# ---------------- JSON / Binary ----------------
+# Same computations as Perimeter / PerimeterBatch without any XML:
+#   POST /json  {"lat1": .., ..., "lon3": .., "unit": ..}      -> {"perimeter": x}
+#   POST /json  {"triangles": [[lat1, .., lon3], ...] or [{..}], "metrics": [..], "unit": ..}
+#               -> {"metrics": [..], "results": {"perimeter": [..], ...}}
+#   POST /bin?metrics=perimeter,area&unit=km   body: N*6 little-endian float64
+#               -> N*M little-endian float64, row-major (X-Count, X-Metrics)
+# Content-Type application/json or application/octet-stream selects the
+# format on any path as well.
+class RequestError(Exception):
+    pass
+
+def metric_names(names):
+    if names is not None and not isinstance(names, list):
+        raise RequestError('metrics must be a list of names')
+    names = list(names or []) or ['perimeter']
+    unknown = [n for n in names if n not in BATCH_METRICS]
+    if unknown:
+        raise RequestError('unknown metric(s): %s (expected %s)' % (', '.join(map(str, unknown)), ', '.join(BATCH_METRICS)))
+    return names
+
+def observed(op, fn, *args):
+    failed = True
+    METRICS.begin()
+    t0 = time.perf_counter()
+    try:
+        result = fn(*args)
+        failed = False
+        return result
+    finally:
+        METRICS.end(op, time.perf_counter() - t0, failed)
+
+def json_call(body):
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise RequestError('invalid JSON: %s' % e)
+    if not isinstance(payload, dict):
+        raise RequestError('expected a JSON object')
+    try:
+        if 'triangles' in payload:
+            names = metric_names(payload.get('metrics'))
+            rows = [[t[k] for k in TRIANGLE_KEYS] if isinstance(t, dict) else t for t in payload['triangles']]
+            coords = np.asarray(rows, dtype=float)
+            if coords.size and (coords.ndim != 2 or coords.shape[1] != 6):
+                raise RequestError('each triangle needs lat1, lon1, lat2, lon2, lat3, lon3')
+            computed = batch_metrics(coords, payload.get('unit', 'meters'))
+            result = {'metrics': names, 'results': dict((n, computed[n].tolist()) for n in names)}
+        else:
+            args = dict((k, float(payload[k])) for k in TRIANGLE_KEYS)
+            if 'unit' in payload:
+                args['unit'] = str(payload['unit'])
+            result = {'perimeter': dispatcher.methods['Perimeter'][0](**args)}
+    except SoapFault as e:
+        raise RequestError(e.faultstring)
+    except (KeyError, TypeError, ValueError) as e:
+        raise RequestError('bad triangle data: %r' % (e,))
+    try:
+        # NaN / Infinity are not JSON; strict parsers reject the whole reply
+        return json.dumps(result, separators=(',', ':'), allow_nan=False).encode('utf-8')
+    except ValueError:
+        raise RequestError('result is not a finite number; check the coordinates')
+
+def binary_call(query, body):
+    if len(body) % 48:
+        raise RequestError('body must be a multiple of 48 bytes (6 float64 per triangle)')
+    names = metric_names([n for n in ','.join(query.get('metrics', [])).split(',') if n])
+    coords = np.frombuffer(body, dtype='<f8').reshape(-1, 6)
+    try:
+        computed = batch_metrics(coords, (query.get('unit') or ['meters'])[-1])
+    except SoapFault as e:
+        raise RequestError(e.faultstring)
+    out = np.empty((len(coords), len(names)), dtype='<f8')
+    for i, n in enumerate(names):
+        out[:, i] = computed[n]
+    return out.tobytes(), [('X-Count', str(len(coords))), ('X-Metrics', ','.join(names))]
+
+def error_response(e):
+    return 400, json.dumps({'error': str(e)}).encode('utf-8'), 'application/json', (), False
+
+def route_request(method, path, headers, body=None):
+    # Transport-independent routing shared by the threaded handler and the
+    # asyncio server. Returns (status, body, content type, extra headers,
+    # body already gzipped).
+    parsed_path = urlparse(path)
+    if method in ('GET', 'HEAD'):
+        query_params = parse_qs(parsed_path.query, keep_blank_values=True)
         if 'wsdl' in query_params or parsed_path.path == '/':
-            wsdl_xml = dispatcher.wsdl()
-            self.send_response(200)
-            self.send_header('Content-type', 'text/xml; charset=utf-8')
-            self.send_header('Content-Length', str(len(wsdl_xml)))
-            self.end_headers()
-            self.wfile.write(wsdl_xml)
-            return
-        self.send_response(404)
+            return wsdl_response(headers)
+        if parsed_path.path == '/metrics':
+            return 200, METRICS.render(), 'text/plain; version=0.0.4; charset=utf-8', (), False
+        return 404, b'Not found\n', 'text/plain', (), False
+    if method == 'POST':
+        if body is None:
+            return 411, b'Content-Length required\n', 'text/plain', (), False
+        content_type = (headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        try:
+            if parsed_path.path.startswith('/bin') or content_type == 'application/octet-stream':
+                query_params = parse_qs(parsed_path.query)
+                data, extra = observed('bin:PerimeterBatch', binary_call, query_params, body)
+                return 200, data, 'application/octet-stream', extra, False
+            if parsed_path.path.startswith('/json') or content_type == 'application/json':
+                return 200, observed('json', json_call, body), 'application/json', (), False
+            return 200, soap_call(body), 'text/xml; charset=utf-8', (), False
+        except RequestError as e:
+            return error_response(e)
+    return 405, b'Method not allowed\n', 'text/plain', [('Allow', 'GET, HEAD, POST')], False
+
+
+class SOAPRequestHandler(SOAPHandler):
+    # HTTP/1.1 with persistent connections: every response carries a
+    # Content-Length, idle connections are dropped after `timeout` seconds and
+    # a connection is closed after `max_requests` requests. An idle connection
+    # also gives up its thread as soon as another connection is waiting for
+    # one, so keep-alive clients cannot starve new ones.
+    protocol_version = 'HTTP/1.1'
+    timeout = 5.0
+    max_requests = 100
+    access_log = True  # one stderr line per request; off in production mode
+    idle_poll = 0.05  # seconds between "is anyone waiting?" checks while idle
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        # True once the next request can be read; False to close the idle
+        # connection (timeout, or the server has connections queued)
+        self.connection.setblocking(False)
+        try:
+            if self.rfile.peek(1):  # pipelined request already buffered
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            wait = self.idle_poll
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return False
+            if select.select([self.connection], [], [], wait)[0]:
+                return True
+            if self.server_busy():
+                return False
+
+    def server_busy(self):
+        pending = getattr(self.server, 'pending', None)
+        if pending is not None:  # PooledHTTPServer: queued means no free worker
+            return not pending.empty()
+        # single-threaded: this thread is the only one, any waiting client counts
+        return bool(select.select([self.server.socket], [], [], 0)[0])
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            SOAPHandler.log_message(self, format, *args)
+
+    def setup(self):
+        SOAPHandler.setup(self)
+        self.requests_handled = 0
+
+    def send_body(self, status, body, content_type, headers=(), compressed=False):
+        body, compressed = encode_body(body, self.headers, compressed)
+        self.requests_handled += 1
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        for name, value in headers:
+            self.send_header(name, value)
+        if self.requests_handled >= self.max_requests:
+            self.send_header('Connection', 'close')  # also sets close_connection
         self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def read_body(self):
+        # Content-Length or chunked framing; gzip request bodies are inflated
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            parts = []
+            size = 0
+            while True:
+                line = self.rfile.readline(65537)
+                chunk = int(line.split(b';', 1)[0].strip() or b'0', 16)
+                if chunk == 0:
+                    while self.rfile.readline(65537) not in (b'\r\n', b'\n', b''):
+                        pass  # trailers
+                    break
+                size += chunk
+                if size > MAX_REQUEST_BODY:
+                    raise ValueError('request body too large')
+                parts.append(self.rfile.read(chunk))
+                self.rfile.readline(3)
+            body = b''.join(parts)
+        else:
+            length = self.headers.get('Content-Length')
+            if length is None:
+                return None
+            length = int(length)
+            if length < 0 or length > MAX_REQUEST_BODY:
+                raise ValueError('request body too large')
+            body = self.rfile.read(length)
+        return inflate_body(body, self.headers.get('Content-Encoding'))
+
+    def do_GET(self):
+        self.send_body(*route_request('GET', self.path, self.headers))
+
+    def do_HEAD(self):
+        self.send_body(*route_request('HEAD', self.path, self.headers))
 
     def do_POST(self):
-        data_bytes = self.rfile.read(int(self.headers['content-length']))
-        data = data_bytes.decode('utf-8')
-        response = dispatcher.dispatch(data)
-        self.send_response(200)
-        self.send_header('Content-type', 'text/xml; charset=utf-8')
-        self.end_headers()
-        self.wfile.write(response)
+        try:
+            data_bytes = self.read_body()
+        except (ValueError, OSError, zlib.error) as e:
+            self.close_connection = True
+            self.send_body(400, ('Bad request body: %s\n' % e).encode('utf-8'), 'text/plain')
+            return
+        if data_bytes is None:
+            self.close_connection = True
+        self.send_body(*route_request('POST', self.path, self.headers, data_bytes))
+
+# ---------------- Concurrent Server ----------------
+BUSY_RESPONSE = (b"HTTP/1.0 503 Service Unavailable\r\n"
+                 b"Content-Type: text/plain\r\n"
+                 b"Content-Length: 12\r\n"
+                 b"Retry-After: 1\r\n"
+                 b"Connection: close\r\n\r\n"
+                 b"Server busy\n")
+
+class PooledHTTPServer(HTTPServer):
+    # A fixed pool of worker threads takes accepted connections from a bounded
+    # queue. When the queue is full the client gets a 503 instead of waiting.
+    def __init__(self, server_address, handler_class, threads=8, queue_depth=64):
+        HTTPServer.__init__(self, server_address, handler_class)
+        self.threads = threads
+        self.pending = queue.Queue(maxsize=queue_depth)
+        self.workers = []
+
+    def start_workers(self):
+        # started lazily so that pre-forked children get their own threads
+        for i in range(self.threads - len(self.workers)):
+            t = threading.Thread(target=self._work, name="soap-worker-%d" % i, daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.start_workers()
+        HTTPServer.serve_forever(self, poll_interval)
+
+    def _work(self):
+        warm_thread()
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        try:
+            self.pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.reject_request(request)
+
+    def reject_request(self, request):
+        try:
+            request.sendall(BUSY_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        # queued connections will not be served any more; dropping them makes
+        # room for the stop markers. The workers are daemon threads, so a
+        # marker that still does not fit cannot hold the process open.
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self.shutdown_request(item[0])
+        for _ in self.workers:
+            try:
+                self.pending.put(None, timeout=1.0)
+            except queue.Full:
+                break
+
+
+def serve_prefork(sock, run_child, workers, cleanup):
+    # The listening socket is created once and shared by forked children, each
+    # running its own accept loop (thread pool or event loop).
+    sock.setblocking(False)  # a child that loses the accept race just polls again
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_child()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            os.waitpid(pid, 0)
+    finally:
+        cleanup()
+
+
+# ---------------- asyncio Server ----------------
+MAX_HEADER_BYTES = 64 * 1024
+access_log = logging.getLogger('TriangleService.access')
+
+CONTINUE = b'HTTP/1.1 100 Continue\r\n\r\n'
+
+async def read_request(reader, idle_timeout=None, read_timeout=None, expect_continue=None):
+    # Returns (method, path, version, headers, body) or None on a clean EOF.
+    # idle_timeout only covers the wait for the first byte; after that each
+    # read gets read_timeout, so a slow client that keeps sending is not cut
+    # off (the threaded server's timeout is per recv as well). The body is
+    # returned as sent; dispatch_request inflates it on a dispatch thread.
+    # expect_continue() is awaited before reading a body the client holds
+    # back for "Expect: 100-continue".
+    def read(aw):
+        return asyncio.wait_for(aw, read_timeout)
+
+    async def read_exactly(n):
+        parts = []
+        while n > 0:
+            data = await read(reader.read(min(n, 65536)))
+            if not data:
+                raise asyncio.IncompleteReadError(b''.join(parts), n)
+            parts.append(data)
+            n -= len(data)
+        return b''.join(parts)
+
+    head = await asyncio.wait_for(reader.read(1), idle_timeout)
+    if not head:
+        return None
+    while True:
+        try:
+            line = await read(reader.readuntil(b'\n'))
+        except asyncio.IncompleteReadError as e:
+            if not (head + e.partial).strip():
+                return None
+            raise ValueError('incomplete request head')
+        except asyncio.LimitOverrunError:
+            raise ValueError('request head too large')
+        head += line
+        if len(head) > MAX_HEADER_BYTES:
+            raise ValueError('request head too large')
+        if line == b'\r\n' and head.strip():
+            break
+    request_line, _, rest = head.lstrip(b'\r\n').partition(b'\r\n')
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise ValueError('malformed request line')
+    method, path, version = parts
+    headers = http.client.parse_headers(io.BytesIO(rest))
+    chunked = headers.get('Transfer-Encoding', '').lower() == 'chunked'
+    length = headers.get('Content-Length')
+    if length is not None and not chunked:
+        length = int(length)
+        if length < 0 or length > MAX_REQUEST_BODY:
+            raise ValueError('request body too large')
+    if (expect_continue is not None and version == 'HTTP/1.1' and (chunked or length)
+            and headers.get('Expect', '').lower() == '100-continue'):
+        await expect_continue()
+    if chunked:
+        chunks = []
+        size = 0
+        while True:
+            line = await read(reader.readline())
+            chunk = int(line.split(b';', 1)[0].strip() or b'0', 16)
+            if chunk == 0:
+                while (await read(reader.readline())) not in (b'\r\n', b'\n', b''):
+                    pass  # trailers
+                break
+            size += chunk
+            if size > MAX_REQUEST_BODY:
+                raise ValueError('request body too large')
+            chunks.append(await read_exactly(chunk))
+            await read(reader.readline())
+        body = b''.join(chunks)
+    elif length is not None:
+        body = await read_exactly(length)
+    else:
+        body = None
+    return method, path, version, headers, body
+
+def dispatch_request(method, path, headers, body):
+    # runs on a dispatch thread, so inflating a large gzip body does not
+    # hold up the event loop
+    if body is not None:
+        try:
+            body = inflate_body(body, headers.get('Content-Encoding'))
+        except (ValueError, zlib.error) as e:
+            return 400, ('Bad request body: %s\n' % e).encode('utf-8'), 'text/plain', (), False
+    return route_request(method, path, headers, body)
+
+def wants_close(version, headers):
+    connection = headers.get('Connection', '').lower()
+    if version == 'HTTP/1.0':
+        return 'keep-alive' not in connection
+    return 'close' in connection
+
+def response_head(status, content_type, length, headers, compressed, close):
+    lines = ['HTTP/1.1 %d %s' % (status, http.HTTPStatus(status).phrase),
+             'Server: TriangleService',
+             'Date: %s' % formatdate(usegmt=True),
+             'Content-Type: %s' % content_type,
+             'Content-Length: %d' % length]
+    if compressed:
+        lines.append('Content-Encoding: gzip')
+    lines.extend('%s: %s' % (name, value) for name, value in headers)
+    lines.append('Connection: %s' % ('close' if close else 'keep-alive'))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+class AsyncSOAPServer:
+    # One event loop holds every connection, which is cheap for thousands of
+    # slow, mostly idle clients; parsing and dispatch run in a thread pool.
+    # Requests may be pipelined with at most `max_in_flight` running per
+    # connection, and responses always go out in request order. SIGINT/SIGTERM
+    # stop accepting, close idle connections and let busy ones finish.
+    def __init__(self, threads=8, max_in_flight=4, timeout=5.0, max_requests=100, drain_timeout=30.0):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='soap-async',
+                                           initializer=warm_thread)
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.drain_timeout = drain_timeout
+        self.connections = {}  # task -> {'writer': ..., 'pending': n}
+        self.draining = False
+        self.stopping = None
+
+    async def serve(self, host=None, port=None, sock=None):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        if sock is not None:
+            server = await asyncio.start_server(self.handle_connection, sock=sock, limit=MAX_HEADER_BYTES)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port,
+                                                limit=MAX_HEADER_BYTES, backlog=1024)
+        async with server:
+            await self.stopping.wait()
+            server.close()
+            await self.drain()
+        self.executor.shutdown(wait=True)
+
+    async def drain(self):
+        self.draining = True
+        for conn in list(self.connections.values()):
+            if conn['pending'] == 0:
+                conn['writer'].close()  # parked in a keep-alive read
+        tasks = list(self.connections)
+        if tasks:
+            done, still_running = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            for task in still_running:
+                task.cancel()
+
+    def stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        conn = {'writer': writer, 'pending': 0}
+        self.connections[asyncio.current_task()] = conn
+        slots = asyncio.Semaphore(self.max_in_flight)
+        responses = asyncio.Queue()
+        sender = asyncio.create_task(self.send_responses(writer, responses, conn))
+        served = 0
+
+        async def expect_continue():
+            # queued like a response, so it cannot overtake earlier ones
+            await responses.put(CONTINUE)
+
+        try:
+            while not self.draining:
+                try:
+                    request = await read_request(reader, self.timeout, self.timeout, expect_continue)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except (ValueError, zlib.error) as e:
+                    fut = loop.create_future()
+                    fut.set_result((400, ('Bad request: %s\n' % e).encode('utf-8'), 'text/plain', (), False))
+                    conn['pending'] += 1
+                    await responses.put((fut, 'POST', '/', {}, True))
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                served += 1
+                close = served >= self.max_requests or self.draining or wants_close(version, headers)
+                await slots.acquire()
+                fut = loop.run_in_executor(self.executor, dispatch_request, method, path, headers, body)
+                fut.add_done_callback(lambda f: slots.release())
+                conn['pending'] += 1
+                await responses.put((fut, method, path, headers, close))
+                if close:
+                    break
+        finally:
+            await responses.put(None)
+            try:
+                await sender
+            except (ConnectionError, OSError):
+                pass
+            writer.close()
+            del self.connections[asyncio.current_task()]
+
+    async def send_responses(self, writer, responses, conn):
+        peer = writer.get_extra_info('peername')
+        while True:
+            item = await responses.get()
+            if item is None:
+                return
+            if item is CONTINUE:
+                writer.write(CONTINUE)
+                await writer.drain()
+                continue
+            fut, method, path, headers, close = item
+            try:
+                status, body, content_type, extra, compressed = await fut
+            except Exception:
+                logging.getLogger('TriangleService').exception('request failed')
+                status, body, content_type, extra, compressed = 500, b'Internal error\n', 'text/plain', (), False
+            body, compressed = encode_body(body, headers, compressed)
+            writer.write(response_head(status, content_type, len(body), extra, compressed, close))
+            if method != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+            conn['pending'] -= 1
+            if SOAPRequestHandler.access_log:
+                access_log.info('%s - "%s %s" %d', peer[0] if peer else '-', method, path, status)
+
 
 # ---------------- Run Server ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Triangle SOAP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=8,
+                        help="request threads per process; 0 = single-threaded (default: 8)")
+    parser.add_argument("--queue-depth", type=int, default=64,
+                        help="accepted connections waiting for a thread before 503 (default: 64)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="pre-forked worker processes sharing the socket (default: 1)")
+    parser.add_argument("--keepalive-timeout", type=float, default=5.0,
+                        help="seconds an idle persistent connection is kept open (default: 5); with "
+                             "threads it is closed early once another connection waits for a thread. "
+                             "Use --async to keep many idle clients open")
+    parser.add_argument("--max-requests", type=int, default=100,
+                        help="requests served on one connection before it is closed (default: 100)")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="entries in the result and response caches; 0 disables both (default: 10000)")
+    parser.add_argument("--cache-ttl", type=float, default=300.0,
+                        help="seconds a cached entry stays valid; 0 = no expiry (default: 300)")
+    parser.add_argument("--cache-precision", type=int, default=9,
+                        help="decimal places coordinates are rounded to for result caching (default: 9)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="asyncio front-end: one event loop for all connections, --threads dispatch threads")
+    parser.add_argument("--max-in-flight", type=int, default=4,
+                        help="(--async) pipelined requests running at once per connection (default: 4)")
+    parser.add_argument("--drain-timeout", type=float, default=30.0,
+                        help="(--async) seconds to let busy connections finish on shutdown (default: 30)")
+    parser.add_argument("--trace", action="store_true",
+                        help="log every request/response envelope (development only; default: off)")
+    parser.add_argument("--production", action="store_true",
+                        help="no access log; watch /metrics instead")
+    parser.add_argument("--index", metavar="FILE",
+                        help="spatial index from 'mosalas.py index' for TrianglesAtPoint / TrianglesInBox")
+    args = parser.parse_args(argv)
+    if args.threads < 0 or args.queue_depth < 1 or args.workers < 1:
+        parser.error("--threads must be >= 0, --queue-depth and --workers >= 1")
+    if args.workers > 1 and not hasattr(os, "fork"):
+        parser.error("--workers > 1 needs os.fork (not available on this platform)")
+
+    SOAPRequestHandler.timeout = args.keepalive_timeout or None
+    SOAPRequestHandler.max_requests = max(args.max_requests, 1)
+    RESULT_CACHE.configure(args.cache_size, args.cache_ttl)
+    RESPONSE_CACHE.configure(args.cache_size, args.cache_ttl)
+    CACHE_PRECISION[0] = args.cache_precision
+    if args.index:
+        t0 = time.perf_counter()
+        index = load_spatial_index(args.index)
+        print("Spatial index %s: %d triangles, UTM zone %d (%.2fs)"
+              % (args.index, len(index), index.zone, time.perf_counter() - t0))
+
+    dispatcher.trace = args.trace
+    if not args.trace:
+        logging.getLogger('pysimplesoap').setLevel(logging.WARNING)
+    if args.production:
+        SOAPRequestHandler.access_log = False
+    if args.trace or not args.production:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    url = "http://%s:%d/" % (args.host, args.port)
+    dispatcher.set_location(url)
+    dispatcher.wsdl_entry()  # render the WSDL once before serving
+
+    print("Triangle SOAP service running at %s" % url)
+    print("For WSDL, go to %s?wsdl" % url)
+    print("Metrics (Prometheus) at %smetrics" % url)
+    print("JSON at %sjson, binary float64 batches at %sbin" % (url, url))
+
+    if args.use_async:
+        server = AsyncSOAPServer(threads=max(args.threads, 1), max_in_flight=max(args.max_in_flight, 1),
+                                 timeout=args.keepalive_timeout or None,
+                                 max_requests=max(args.max_requests, 1), drain_timeout=args.drain_timeout)
+        if args.workers > 1:
+            sock = socket.create_server((args.host, args.port), backlog=1024)
+            serve_prefork(sock, lambda: asyncio.run(server.serve(sock=sock)), args.workers, sock.close)
+        else:
+            asyncio.run(server.serve(args.host, args.port))
+        return
+
+    if args.threads == 0:
+        httpd = HTTPServer((args.host, args.port), SOAPRequestHandler)
+    else:
+        httpd = PooledHTTPServer((args.host, args.port), SOAPRequestHandler,
+                                 threads=args.threads, queue_depth=args.queue_depth)
+    if args.workers > 1:
+        serve_prefork(httpd.socket, httpd.serve_forever, args.workers, httpd.server_close)
+    else:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
 if __name__ == '__main__':
-    httpd = HTTPServer(('127.0.0.1', 8000), SOAPRequestHandler)
-    print("Triangle SOAP service running at http://127.0.0.1:8000/")
-    print("For WSDL, go to http://127.0.0.1:8000/?wsdl")
-    httpd.serve_forever()
+    main()
@@ -0,0 +1,143 @@
+import csv
+import io
+
+import numpy as np
+import pytest
+
+import mosalas
+from mosalas_core import latlon_to_utm, latlon_to_utm_bulk, utm_zone, utm_zones
+
+HEADER = ["id", "lat1", "lon1", "lat2", "lon2", "lat3", "lon3"]
+ROWS = [
+    ["tehran", 35.6892, 51.389, 35.7, 51.42, 35.67, 51.41],
+    ["antimeridian", -16.5, 179.99, -16.49, 180.0, -16.51, 179.995],
+    ["west-edge", 64.0, -180.0, 64.01, -179.99, 63.99, -179.995],
+    ["bad-lat", 95.0, 51.0, 35.0, 51.0, 35.0, 51.1],
+]
+
+
+def write_input(tmp_path):
+    path = tmp_path / "triangles.csv"
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerows(ROWS)
+    return str(path)
+
+
+def test_zone_of_180_is_60():
+    assert utm_zone(180.0) == 60
+    assert utm_zone(-180.0) == 1
+    assert latlon_to_utm_bulk([0.0, 0.0], [180.0, 179.0])[2].tolist() == [60, 60]
+    assert latlon_to_utm(-16.5, 180.0)[2] == 60
+    lons = np.linspace(-180.0, 180.0, 1441)
+    assert utm_zones(lons).tolist() == [utm_zone(lon) for lon in lons]
+
+
+@pytest.mark.parametrize("engine", mosalas.ENGINES)
+def test_batch_csv_with_antimeridian_row(tmp_path, engine):
+    out = io.StringIO()
+    assert mosalas.run_batch(write_input(tmp_path), out, chunk_size=2, engine=engine) == len(ROWS)
+    rows = {r["id"]: r for r in csv.DictReader(io.StringIO(out.getvalue()))}
+    assert rows["tehran"]["status"] == "ok" and rows["tehran"]["zone"] == "39"
+    assert rows["antimeridian"]["status"] == "ok"
+    assert rows["antimeridian"]["zone"] == "60" and rows["antimeridian"]["multi_zone"] == "0"
+    assert rows["west-edge"]["zone"] == "1"
+    assert float(rows["antimeridian"]["area_m2"]) > 0
+    assert rows["bad-lat"]["status"] == "out_of_range"
+
+
+def test_engines_agree_on_small_triangles(tmp_path):
+    path = write_input(tmp_path)
+    results = {}
+    for engine in mosalas.ENGINES:
+        out = io.StringIO()
+        mosalas.run_batch(path, out, engine=engine)
+        results[engine] = {r["id"]: r for r in csv.DictReader(io.StringIO(out.getvalue()))}
+    for tid in ("tehran", "antimeridian"):
+        utm, geo = (float(results[e][tid]["perimeter_m"]) for e in ("utm", "geodesic"))
+        assert utm == pytest.approx(geo, rel=2e-3)  # UTM scale error stays under 0.1%
+
+
+def test_png_names_do_not_collide():
+    used = set()
+    names = [mosalas.png_name(i, used) for i in ("x/0", "x_0", "X_0", "x_0-2", "", "")]
+    assert names == ["x_0.png", "x_0-2.png", "X_0-3.png", "x_0-2-2.png", "triangle.png", "triangle-2.png"]
+    assert mosalas.png_name("x/0") == "x_0.png"
+
+
+def check_columnar(out_dir, csv_rows):
+    cols, meta = mosalas.load_columnar(out_dir)
+    assert meta["count"] == len(csv_rows)
+    assert mosalas.columnar_ids(cols) == [r["id"] for r in csv_rows]
+    assert len(cols["id_offsets"]) == len(csv_rows) + 1
+    for i, row in enumerate(csv_rows):
+        assert meta["status_names"][cols["status"][i]] == row["status"]
+        if row["status"] == "out_of_range":
+            continue
+        assert str(cols["zone"][i]) == row["zone"]
+        assert int(cols["multi_zone"][i]) == int(row["multi_zone"])
+        assert meta["type_names"][cols["type_code"][i]] == row["type"]
+        assert int(cols["right"][i]) == int(row["right"])
+        for col, name in (("perimeter", "perimeter_m"), ("area", "area_m2"), ("ab", "ab_m"),
+                          ("angle_a", "angle_a"), ("angle_c", "angle_c")):
+            assert float(cols[col][i]) == pytest.approx(float(row[name]), abs=5e-4)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_columnar_output_round_trips(tmp_path, parallel):
+    path = write_input(tmp_path)
+    with open(path, "a", newline="") as f:
+        csv.writer(f).writerow(["ünïcode-id", 35.0, 51.0, 35.1, 51.0, 35.0, 51.1])
+    out = io.StringIO()
+    mosalas.run_batch(path, out)
+    csv_rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    out_dir = str(tmp_path / "columns")
+    if parallel:
+        mosalas.run_batch_parallel(path, out_dir, chunk_size=2, workers=2, prewarm_zones=(), fmt="npy")
+    else:
+        mosalas.run_batch(path, out_dir, chunk_size=2, fmt="npy")
+    check_columnar(out_dir, csv_rows)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_columnar_output_of_an_empty_input(tmp_path, parallel):
+    path = tmp_path / "empty.csv"
+    path.write_text(",".join(HEADER) + "\n")
+    out_dir = str(tmp_path / "columns")
+    if parallel:
+        mosalas.run_batch_parallel(str(path), out_dir, workers=2, prewarm_zones=(), fmt="npy")
+    else:
+        assert mosalas.run_batch(str(path), out_dir, fmt="npy") == 0
+    cols, meta = mosalas.load_columnar(out_dir)
+    assert meta["count"] == 0
+    assert mosalas.columnar_ids(cols) == []
+    assert cols["id_offsets"].tolist() == [0]
+    assert all(len(cols[name]) == 0 for name in meta["columns"] if name != "id_offsets")
+
+
+def test_blank_csv_lines_are_skipped(tmp_path, recwarn):
+    path = tmp_path / "blank.csv"
+    path.write_text(",".join(HEADER) + "\n\n" + ",".join(map(str, ROWS[0])) + "\n\r\n\n"
+                    + ",".join(map(str, ROWS[1])) + "\n\n")
+    chunks = list(mosalas.iter_triangle_chunks(str(path), 1))
+    assert [ids for ids, _ in chunks] == [["tehran"], ["antimeridian"]]
+    out = io.StringIO()
+    assert mosalas.run_batch(str(path), out, chunk_size=1) == 2
+    assert [r["status"] for r in csv.DictReader(io.StringIO(out.getvalue()))] == ["ok", "ok"]
+    assert not [w for w in recwarn if "loadtxt" in str(w.message)]
+
+
+def test_triangle_status_precedence():
+    big, tiny = 4e6, 1e-4
+    res = {
+        "ab": np.array([10.0, big, 10.0, tiny, tiny, big, 10.0]),
+        "bc": np.array([10.0, 10.0, 20.0, 10.0, 10.0, 10.0, 10.0]),
+        "ca": np.array([10.0, big, 10.0, 10.0, 10.0, big, 10.0]),
+        "area": np.array([40.0, 5e6, 0.0, 0.0, 1.0, 0.0, 40.0]),
+    }
+    in_range = np.array([True, True, True, True, True, True, False])
+    names = [mosalas.STATUS_NAMES[c] for c in mosalas.triangle_status(in_range, res)]
+    # degenerate wins over not_triangle; long_edge only marks otherwise ok rows
+    assert names == ["ok", "long_edge", "not_triangle", "degenerate", "degenerate",
+                     "not_triangle", "out_of_range"]
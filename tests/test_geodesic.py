@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from mosalas_core import batch_geodesic_metrics, geodesic_area, geodesic_metrics, wgs84_geod
+
+
+def reference_area(tri):
+    tri = np.asarray(tri, dtype=float)
+    return abs(wgs84_geod().polygon_area_perimeter(tri[:, 1], tri[:, 0])[0])
+
+
+def centres(n=200, seed=7):
+    rng = np.random.default_rng(seed)
+    return np.c_[rng.uniform(-80, 80, n), rng.uniform(-179, 179, n)]
+
+
+@pytest.mark.parametrize("offsets", [
+    [(0, 0), (1e-4, 0), (0, 1e-4)],                # ~11 m parcel
+    [(0, 0), (1e-4, 1e-4), (5.2e-5, 4.8e-5)],      # ~11 m sliver
+    [(0, 0), (0.45, 0), (0.225, 0.001)],           # ~50 km sliver
+    [(0, 0), (0.3, 0), (0, 0.3)],                  # ~30 km right triangle
+    [(0, 0), (4, 1), (-2, 5)],                     # several hundred km
+], ids=["small", "small-sliver", "long-sliver", "medium", "large"])
+def test_area_matches_geod(offsets):
+    ctr = centres()
+    latlon = ctr[:, None, :] + np.asarray(offsets, dtype=float)
+    expected = np.array([reference_area(t) for t in latlon])
+    tolerance = 1e-6 * expected + 1e-3
+    batch = batch_geodesic_metrics(latlon)["area"]
+    assert np.all(np.abs(batch - expected) <= tolerance)
+    for tri, want in zip(latlon[:20], expected[:20]):
+        A, B, C = (tuple(p) for p in tri)
+        assert geodesic_area(A, B, C) == pytest.approx(want, rel=1e-6, abs=1e-3)
+        assert geodesic_metrics(A, B, C).area == pytest.approx(want, rel=1e-6, abs=1e-3)
+
+
+def test_exact_area_option():
+    latlon = centres(20)[:, None, :] + np.array([(0, 0), (0.45, 0), (0.225, 0.001)])
+    exact = batch_geodesic_metrics(latlon, exact_area=True)["area"]
+    assert np.array_equal(exact, [reference_area(t) for t in latlon])
+
+
+def test_octant():
+    m = geodesic_metrics((0, 0), (0, 90), (90, 0))
+    assert m.angles == pytest.approx((90, 90, 90))
+    # one eighth of the ellipsoid; a single osculating sphere is only good
+    # to ~1e-3 at this size (exact_area=True is exact)
+    assert m.area == pytest.approx(reference_area([(0, 0), (0, 90), (90, 0)]), rel=1e-3)
@@ -0,0 +1,47 @@
+import math
+
+import numpy as np
+
+from mosalas_core import (TYPE_NAMES, _angles_from_sides, area_from_coords, batch_triangle_metrics, dist,
+                          is_right_triangle, triangle_angles, triangle_perimeter, triangle_type_by_sides)
+
+
+def sample_triangles():
+    rng = np.random.default_rng(7)
+    tris = list(rng.uniform(-5e5, 5e5, size=(500, 3, 2)))
+    tris += [
+        [(0, 0), (3, 0), (0, 4)],                  # right
+        [(0, 0), (1e5, 0), (1e5, 2.5e5)],          # right, large
+        [(0, 0), (2, 0), (1, 3 ** 0.5)],           # equilateral
+        [(0, 0), (4, 0), (2, 7)],                  # isosceles
+        [(0, 0), (1, 1), (2, 2)],                  # collinear
+        [(5, 5), (5, 5), (9, 1)],                  # two points equal
+        [(3, 3), (3, 3), (3, 3)],                  # a single point
+    ]
+    return np.asarray(tris, dtype=float)
+
+
+def ulps(x, y):
+    return abs(x - y) / np.spacing(max(abs(x), abs(y)))
+
+
+def test_batch_matches_scalar_functions():
+    tris = sample_triangles()
+    res = batch_triangle_metrics(tris)
+    for i, (A, B, C) in enumerate(tris.tolist()):
+        for side, (P, Q) in (("ab", (A, B)), ("bc", (B, C)), ("ca", (C, A))):
+            assert ulps(res[side][i], dist(P, Q)) <= 1
+        # numpy's arccos and hypot may round differently from libm's by one
+        # ulp, and the law of cosines magnifies a side's last bit on thin
+        # triangles, so the angles are checked from the batch's own sides:
+        # one ulp of the angle in radians, shown in degrees
+        batch_angles = (res["angle_a"][i], res["angle_b"][i], res["angle_c"][i])
+        for scalar, batch in zip(_angles_from_sides(res["bc"][i], res["ca"][i], res["ab"][i]), batch_angles):
+            assert abs(batch - scalar) <= math.degrees(np.spacing(math.radians(scalar))) + np.spacing(scalar)
+        angles = triangle_angles(A, B, C)
+        assert np.allclose(batch_angles, angles, rtol=0, atol=1e-6)
+        assert TYPE_NAMES[res["type_code"][i]] == triangle_type_by_sides(A, B, C)
+        assert bool(res["right"][i]) == is_right_triangle(angles)
+        assert ulps(res["perimeter"][i], triangle_perimeter(A, B, C)) <= 2
+        assert res["area"][i] == area_from_coords(A, B, C)
+
@@ -0,0 +1,293 @@
+import http.client
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import soap
+
+
+@pytest.fixture
+def pooled_server():
+    server = soap.PooledHTTPServer(("127.0.0.1", 0), soap.SOAPRequestHandler, threads=2, queue_depth=8)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def get(conn, path):
+    conn.request("GET", path)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def test_idle_keepalive_clients_do_not_starve_the_pool(pooled_server):
+    # both workers sit on idle persistent connections; a third client must
+    # still be served right away, not after the keep-alive timeout
+    idle = [http.client.HTTPConnection("127.0.0.1", pooled_server, timeout=10) for _ in range(2)]
+    for conn in idle:
+        assert get(conn, "/metrics") == 200
+    t0 = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", pooled_server, timeout=10)
+    assert get(conn, "/metrics") == 200
+    assert time.perf_counter() - t0 < 1.0
+    # an active client keeps its connection
+    sock = conn.sock
+    assert get(conn, "/metrics") == 200
+    assert conn.sock is sock
+
+
+def test_tracing_is_off_by_default():
+    assert soap.dispatcher.trace is False
+
+
+def test_invalid_utf8_soap_body_is_a_400():
+    status, body, content_type, _, _ = soap.route_request(
+        "POST", "/", {"Content-Type": "text/xml"}, b"<soap:Envelope>\xff\xfe</soap:Envelope>")
+    assert status == 400
+    assert content_type == "application/json"
+    assert b"UTF-8" in body
+
+
+def test_gzip_wsdl_has_its_own_etag():
+    status, plain, _, extra, compressed = soap.route_request("GET", "/?wsdl", {})
+    assert status == 200 and not compressed
+    etag = dict(extra)["ETag"]
+    status, body, _, extra, compressed = soap.route_request("GET", "/?wsdl", {"Accept-Encoding": "gzip"})
+    assert status == 200 and compressed
+    etag_gz = dict(extra)["ETag"]
+    assert etag_gz != etag and etag_gz.startswith('"') and etag_gz.endswith('-gzip"')
+    # each tag only revalidates its own representation
+    assert soap.route_request("GET", "/?wsdl", {"If-None-Match": etag})[0] == 304
+    assert soap.route_request("GET", "/?wsdl", {"If-None-Match": etag_gz})[0] == 200
+    assert soap.route_request("GET", "/?wsdl", {"If-None-Match": etag_gz, "Accept-Encoding": "gzip"})[0] == 304
+
+
+def test_cache_counters_follow_prometheus_naming():
+    text = soap.METRICS.render().decode("utf-8")
+    for cache in ("result", "response"):
+        for field in ("hits", "misses", "evictions", "expirations"):
+            metric = "triangle_soap_%s_cache_%s_total" % (cache, field)
+            assert "# HELP %s " % metric in text
+            assert "# TYPE %s counter" % metric in text
+        assert "# TYPE triangle_soap_%s_cache_size gauge" % cache in text
+    assert "triangle_soap_result_cache_hits " not in text
+
+
+@pytest.fixture
+def async_server():
+    import asyncio
+    import socket
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    server = soap.AsyncSOAPServer(threads=2, timeout=1.0, drain_timeout=1.0)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(sock=sock),), daemon=True)
+    thread.start()
+    while server.stopping is None:
+        time.sleep(0.01)
+    yield sock.getsockname()[1]
+    loop.call_soon_threadsafe(server.stop)
+    thread.join(5)
+    loop.close()
+
+
+def raw_request(port, head, body_parts=(), pause=0.0):
+    import socket
+
+    conn = socket.create_connection(("127.0.0.1", port), timeout=5)
+    conn.sendall(head)
+    for part in body_parts:
+        time.sleep(pause)
+        conn.sendall(part)
+    return conn
+
+
+def read_response(conn):
+    data = b""
+    while b"\r\n\r\n" not in data:
+        data += conn.recv(65536)
+    head, _, body = data.partition(b"\r\n\r\n")
+    length = int([l for l in head.split(b"\r\n") if l.lower().startswith(b"content-length")][0].split(b":")[1])
+    while len(body) < length:
+        body += conn.recv(65536)
+    return head, body
+
+
+JSON_BODY = b'{"lat1": 35.0, "lon1": 51.0, "lat2": 35.1, "lon2": 51.0, "lat3": 35.0, "lon3": 51.1}'
+
+
+def test_async_server_waits_for_a_slow_body(async_server):
+    # the whole upload takes longer than the 1 s keep-alive timeout, but no
+    # single read waits that long
+    head = b"POST /json HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n" % len(JSON_BODY)
+    parts = [JSON_BODY[i:i + 10] for i in range(0, len(JSON_BODY), 10)]
+    conn = raw_request(async_server, head, parts, pause=0.2)
+    head, body = read_response(conn)
+    conn.close()
+    assert head.startswith(b"HTTP/1.1 200")
+    assert b"perimeter" in body
+
+
+def test_async_server_answers_expect_100_continue(async_server):
+    head = (b"POST /json HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+            b"Expect: 100-continue\r\nContent-Length: %d\r\n\r\n" % len(JSON_BODY))
+    conn = raw_request(async_server, head)
+    conn.settimeout(0.5)
+    assert conn.recv(64) == b"HTTP/1.1 100 Continue\r\n\r\n"
+    conn.settimeout(5)
+    conn.sendall(JSON_BODY)
+    head, body = read_response(conn)
+    conn.close()
+    assert head.startswith(b"HTTP/1.1 200")
+
+
+def test_out_of_range_coordinates_are_rejected():
+    with pytest.raises(soap.SoapFault) as e:
+        soap.Perimeter(95, 0, 1, 1, 2, 2)
+    assert e.value.faultcode == "BadCoordinate"
+    with pytest.raises(soap.SoapFault):
+        soap.Perimeter(float("nan"), 0, 1, 1, 2, 2, unit="km")
+    # the degrees engine works on raw numbers, as before
+    assert soap.Perimeter(95, 0, 1, 1, 2, 2, unit="degrees") > 0
+
+    envelope = ('<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+                'xmlns:t="http://example.org/triangle"><soap:Body><t:Perimeter>'
+                '<t:lat1>95</t:lat1><t:lon1>0</t:lon1><t:lat2>1</t:lat2><t:lon2>1</t:lon2>'
+                '<t:lat3>2</t:lat3><t:lon3>2</t:lon3></t:Perimeter></soap:Body></soap:Envelope>')
+    status, body, _, _, _ = soap.route_request("POST", "/", {}, envelope.encode("utf-8"))
+    assert b"BadCoordinate" in body and b"nan" not in body
+
+    rows = [[35.0, 51.0, 35.1, 51.0, 35.0, 51.1], [95.0, 0.0, 1.0, 1.0, 2.0, 2.0]]
+    with pytest.raises(soap.SoapFault):
+        soap.batch_metrics(rows)
+    status, body, _, _, _ = soap.route_request(
+        "POST", "/json", {"Content-Type": "application/json"}, json.dumps({"triangles": rows}).encode())
+    assert status == 400 and b"triangle 1" in body
+    status, _, _, _, _ = soap.route_request(
+        "POST", "/bin", {}, np.asarray(rows, dtype="<f8").tobytes())
+    assert status == 400
+
+
+def post_json(payload):
+    return soap.route_request("POST", "/json", {"Content-Type": "application/json"},
+                              json.dumps(payload).encode("utf-8"))
+
+
+def test_json_replies_are_strict_json():
+    row = [35.0, 51.0, 35.1, 51.0, float("nan"), 51.1]
+    status, body, _, _, _ = post_json({"triangles": [row], "unit": "degrees"})
+    assert status == 400
+    json.loads(body)
+    status, body, _, _, _ = post_json(dict(zip(soap.TRIANGLE_KEYS, row), unit="degrees"))
+    assert status == 400 and b"NaN" not in body
+
+
+def test_json_metrics_must_be_a_list():
+    row = [35.0, 51.0, 35.1, 51.0, 35.0, 51.1]
+    status, body, _, _, _ = post_json({"triangles": [row], "metrics": "area"})
+    assert status == 400 and b"must be a list" in body
+    status, body, _, _, _ = post_json({"triangles": [row], "metrics": ["area"]})
+    assert status == 200 and list(json.loads(body)["results"]) == ["area"]
+
+
+PERIMETER_ENVELOPE = ('<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+                      'xmlns:t="http://example.org/triangle"><soap:Body><t:Perimeter>'
+                      '<t:lat1>35.0</t:lat1><t:lon1>51.0</t:lon1><t:lat2>35.1</t:lat2><t:lon2>51.0</t:lon2>'
+                      '<t:lat3>35.0</t:lat3><t:lon3>51.1</t:lon3></t:Perimeter></soap:Body></soap:Envelope>')
+
+
+def test_response_cache_hits_do_not_extend_the_ttl():
+    cache = soap.RESPONSE_CACHE
+    saved = cache.maxsize, cache.ttl
+    cache.configure(10, 0.3)
+    cache.clear()
+    try:
+        soap.dispatcher.dispatch(PERIMETER_ENVELOPE)
+        time.sleep(0.2)
+        before = cache.stats()
+        soap.dispatcher.dispatch(PERIMETER_ENVELOPE)  # hit
+        time.sleep(0.2)
+        soap.dispatcher.dispatch(PERIMETER_ENVELOPE)  # 0.4 s after the put: expired
+        after = cache.stats()
+        assert after["hits"] - before["hits"] == 1
+        assert after["expirations"] - before["expirations"] == 1
+    finally:
+        cache.configure(*saved)
+        cache.clear()
+
+
+def perimeter_envelope(soap_prefix, ns_prefix, values, unit=None, header=False):
+    args = "".join("<{p}:{k}>{v}</{p}:{k}>".format(p=ns_prefix, k=k, v=v) for k, v in zip(soap.TRIANGLE_KEYS, values))
+    if unit is not None:
+        args += "<{p}:unit>{u}</{p}:unit>".format(p=ns_prefix, u=unit)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<{s}:Envelope xmlns:{s}="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:{p}="http://example.org/triangle">{h}<{s}:Body><{p}:Perimeter>{a}</{p}:Perimeter>'
+            '</{s}:Body></{s}:Envelope>').format(s=soap_prefix, p=ns_prefix, a=args,
+                                                  h="<%s:Header/>" % soap_prefix if header else "")
+
+
+@pytest.mark.parametrize("soap_prefix,ns_prefix", [("soap", "t"), ("SOAP-ENV", "ns1"), ("s", "tri")])
+@pytest.mark.parametrize("values,unit", [
+    (("35.6892", "51.389", "35.7", "51.42", "35.67", "51.41"), None),
+    (("+35.6892", "-51.389", "-3.5e1", "5.142E+1", ".5", "12."), "km"),
+    (("1e-3", "-0", "0.0", "2.5e-05", "-1E0", "+7"), "degrees"),
+    (("35.6892", "51.389", "35.7", "51.42", "35.67", "51.41"), "metres"),
+])
+def test_fast_path_is_byte_identical(soap_prefix, ns_prefix, values, unit):
+    xml = perimeter_envelope(soap_prefix, ns_prefix, values, unit, header=unit == "km")
+    fast = soap.FAST_OPERATIONS["Perimeter"].dispatch(xml)
+    assert fast is not None
+    assert fast == soap.SoapDispatcher.dispatch(soap.dispatcher, xml)
+
+
+def test_fast_path_falls_back_on_a_bad_unit():
+    xml = perimeter_envelope("soap", "t", ("35", "51", "35.1", "51", "35", "51.1"), "furlongs")
+    assert soap.FAST_OPERATIONS["Perimeter"].dispatch(xml) is None
+    response = soap.dispatcher.dispatch(xml)
+    assert response == soap.SoapDispatcher.dispatch(soap.dispatcher, xml)
+    assert b"UnknownUnit" in response
+
+
+class FakeIndex:
+    zone = 39
+
+
+def test_request_threads_warm_the_index_zone(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(soap.TRANSFORMER_POOL, "prewarm", lambda zones: warmed.append(
+        (threading.current_thread().name, list(zones))))
+    monkeypatch.setattr(soap, "SPATIAL_INDEX", [FakeIndex()])
+    server = soap.PooledHTTPServer(("127.0.0.1", 0), soap.SOAPRequestHandler, threads=2, queue_depth=8)
+    server.start_workers()
+    async_server = soap.AsyncSOAPServer(threads=1)
+    async_server.executor.submit(lambda: None).result()
+    async_server.executor.shutdown()
+    server.server_close()
+    for t in server.workers:
+        t.join(5)
+    assert sorted(warmed) == [("soap-async_0", [39]), ("soap-worker-0", [39]), ("soap-worker-1", [39])]
+
+
+def test_server_close_does_not_block_on_a_full_queue():
+    import socket
+
+    server = soap.PooledHTTPServer(("127.0.0.1", 0), soap.SOAPRequestHandler, threads=2, queue_depth=1)
+    server.workers = [None, None]  # busy workers that never take the queue
+    queued, peer = socket.socketpair()
+    server.process_request(queued, ("127.0.0.1", 0))
+    assert server.pending.full()
+    closer = threading.Thread(target=server.server_close, daemon=True)
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert peer.recv(1) == b""  # the queued connection was closed, not left hanging
+    peer.close()
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from mosalas_core import TriangleGridIndex, points_in_triangles, triangles_intersect_boxes
+
+
+def random_triangles(n=3000, extent=20000.0, spread=60.0, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, extent, (n, 2))
+    return centres[:, None, :] + rng.normal(0, spread, (n, 3, 2))
+
+
+def brute_point(tris, p):
+    return np.flatnonzero(points_in_triangles(tris, np.broadcast_to(p, (len(tris), 2))))
+
+
+def test_point_queries_match_scan():
+    tris = random_triangles()
+    index = TriangleGridIndex(tris)
+    points = np.random.default_rng(1).uniform(0, 20000, (500, 2))
+    located = index.locate(points)
+    for p, first in zip(points, located):
+        want = brute_point(tris, p)
+        assert np.array_equal(index.query_point(*p), want)
+        assert first == (want[0] if len(want) else -1)
+
+
+def test_bbox_queries_match_scan():
+    tris = random_triangles()
+    index = TriangleGridIndex(tris)
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        x, y = rng.uniform(-500, 20000, 2)
+        w, h = rng.uniform(0, 2000, 2)
+        box = [x, y, x + w, y + h]
+        want = np.flatnonzero(triangles_intersect_boxes(tris, np.broadcast_to(box, (len(tris), 4))))
+        assert np.array_equal(index.query_bbox(*box), want)
+
+
+def test_degenerate_triangles_contain_nothing():
+    tris = np.array([
+        [(0.0, 0.0), (10.0, 0.0), (0.0, 10.0)],     # real parcel
+        [(50.0, 50.0), (50.0, 50.0), (50.0, 50.0)],  # coincident vertices
+        [(0.0, 20.0), (10.0, 20.0), (20.0, 20.0)],   # collinear
+        [(30.0, 30.0), (30.0, 30.0), (40.0, 40.0)],  # two vertices equal
+    ])
+    index = TriangleGridIndex(tris, ids=["ok", "point", "line", "segment"])
+    for p in [(53.0, 50.0), (50.0, 50.0), (5.0, 20.0), (35.0, 35.0), (25.0, 20.0)]:
+        assert len(index.query_point(*p)) == 0, p
+    assert index.id_of(index.query_point(2.0, 2.0)) == ["ok"]
+    assert index.locate([(50.0, 50.0), (5.0, 20.0), (2.0, 2.0)]).tolist() == [-1, -1, 0]
+    assert not points_in_triangles(tris[1:2], np.array([(50.0, 50.0)]))[0]
+
+
+def test_sat_box_cases():
+    tri = np.array([[(0.0, 0.0), (10.0, 0.0), (0.0, 10.0)]])
+    for box, expected in [([6, 6, 7, 7], False), ([4, 4, 5, 5], True), ([-1, -1, 11, 11], True),
+                          ([1, 1, 2, 2], True), ([5.1, 5.1, 9, 9], False), ([10, 0, 12, 1], True)]:
+        assert triangles_intersect_boxes(tri, np.array([box], dtype=float))[0] == expected, box
+
+
+def test_save_load_roundtrip(tmp_path):
+    tris = random_triangles(500)
+    index = TriangleGridIndex(tris, ids=[f"p{i}" for i in range(len(tris))], zone=39)
+    path = tmp_path / "parcels.npz"
+    index.save(str(path))
+    loaded = TriangleGridIndex.load(str(path))
+    assert loaded.zone == 39 and len(loaded) == len(index)
+    points = np.random.default_rng(3).uniform(0, 20000, (200, 2))
+    assert np.array_equal(loaded.locate(points), index.locate(points))
+    hit = points[index.locate(points) >= 0][0]
+    assert loaded.id_of(loaded.query_point(*hit)) == index.id_of(index.query_point(*hit))
+
+
+def test_bad_box():
+    index = TriangleGridIndex(random_triangles(10))
+    with pytest.raises(ValueError):
+        index.query_bbox(10, 10, 0, 0)
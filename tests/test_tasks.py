@@ -0,0 +1,42 @@
+import threading
+
+import mosalas
+
+
+class FakeRoot:
+    def __init__(self):
+        self.pending = {}
+
+    def after(self, ms, fn):
+        handle = object()
+        self.pending[handle] = fn
+        return handle
+
+    def after_cancel(self, handle):
+        del self.pending[handle]
+
+
+def test_shutdown_cancels_running_and_queued_jobs():
+    root = FakeRoot()
+    tasks = mosalas.TaskQueue(root)
+    started = threading.Event()
+    stopped = []
+
+    def job(progress):
+        started.set()
+        try:
+            while True:
+                progress(0)
+        except mosalas.TaskCancelled:
+            stopped.append(True)
+            raise
+
+    running = tasks.submit("run", job, progress=True)
+    queued = tasks.submit("queued", job, progress=True)
+    assert started.wait(5)
+    executor = tasks._executor
+    tasks.shutdown()
+    executor.shutdown(wait=True)
+    assert stopped == [True]
+    assert running.cancelled and queued.cancelled and queued.future.cancelled()
+    assert root.pending == {}